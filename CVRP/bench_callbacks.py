@@ -0,0 +1,89 @@
+"""距離コールバックの速度比較 (arc evaluations / s)
+
+同じ決定的な探索 (PATH_CHEAPEST_ARC + 局所最適まで) を
+- legacy: IndexToNode + list of lists を引く Python コールバック
+- index : 事前計算した index→node 対応表を引く Python コールバック
+- matrix: RegisterTransitMatrix (C++ 側で評価)
+で解き、legacy で数えた評価回数を各方式の所要時間で割る。
+"""
+
+import math
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from scipy.spatial import distance_matrix
+
+from callbacks import index_to_node_array, register_demand_callback
+
+
+def build_locations(cluster_id):
+    df_center = pd.read_csv("output/centers.csv")
+    df = pd.read_csv(f"output/cluster{cluster_id:02d}.csv")
+    center_xy = df_center[["x", "y"]].iloc[cluster_id - 1].values
+    return np.vstack([center_xy.reshape(1, 2), df[["x", "y"]].values])
+
+
+def solve(locations, mode):
+    """mode ごとに距離コールバックを登録して解き、(評価回数, 秒, 目的関数値) を返す"""
+    matrix = distance_matrix(locations, locations).astype(int).tolist()
+    num_vehicles = math.ceil((len(locations) - 1) / 50)
+    manager = pywrapcp.RoutingIndexManager(len(matrix), num_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    calls = [0]
+
+    if mode == "legacy":
+
+        def distance_callback(from_index, to_index):
+            calls[0] += 1
+            from_node = manager.IndexToNode(from_index)
+            to_node = manager.IndexToNode(to_index)
+            return matrix[from_node][to_node]
+
+        transit = routing.RegisterTransitCallback(distance_callback)
+    elif mode == "index":
+        index_to_node = index_to_node_array(manager).tolist()
+
+        def distance_callback(from_index, to_index):
+            return matrix[index_to_node[from_index]][index_to_node[to_index]]
+
+        transit = routing.RegisterTransitCallback(distance_callback)
+    else:
+        transit = routing.RegisterTransitMatrix(matrix)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(transit)
+    demand = register_demand_callback(routing, [0] + [1] * (len(matrix) - 1))
+    routing.AddDimensionWithVehicleCapacity(
+        demand, 0, [50] * num_vehicles, True, "Capacity"
+    )
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    )
+    start = time.perf_counter()
+    solution = routing.SolveWithParameters(search_parameters)
+    elapsed = time.perf_counter() - start
+    return calls[0], elapsed, solution.ObjectiveValue()
+
+
+if __name__ == "__main__":
+    cluster_ids = [int(c) for c in sys.argv[1:]] or list(range(1, 11))
+
+    print(
+        f"{'cluster':>7} {'nodes':>6} {'evals':>10} "
+        f"{'legacy/s':>12} {'index/s':>12} {'matrix/s':>12} {'speedup':>8}"
+    )
+    for cluster_id in cluster_ids:
+        locations = build_locations(cluster_id)
+        evals, t_legacy, obj_legacy = solve(locations, "legacy")
+        _, t_index, obj_index = solve(locations, "index")
+        _, t_matrix, obj_matrix = solve(locations, "matrix")
+        assert obj_legacy == obj_index == obj_matrix
+        print(
+            f"{cluster_id:>7} {len(locations):>6} {evals:>10} "
+            f"{evals / t_legacy:>12,.0f} {evals / t_index:>12,.0f} "
+            f"{evals / t_matrix:>12,.0f} {t_legacy / t_matrix:>7.1f}x"
+        )
@@ -0,0 +1,62 @@
+"""calc_xy の行ごとループとベクトル化版の速度比較"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from calc_lat_lon import calc_lat_lon_array
+from calc_xy import calc_xy, calc_xy_array
+from grs80 import LAMBDA0_DEG, PHI0_DEG
+
+
+def bench_iterrows(df):
+    """従来の df.iterrows() + calc_xy による変換"""
+    xy_coords = [
+        calc_xy(row["latitude"], row["longitude"], PHI0_DEG, LAMBDA0_DEG)
+        for _, row in df.iterrows()
+    ]
+    return np.array(xy_coords)
+
+
+def bench_array(df):
+    """calc_xy_array による一括変換"""
+    x, y = calc_xy_array(
+        df["latitude"].to_numpy(), df["longitude"].to_numpy(), PHI0_DEG, LAMBDA0_DEG
+    )
+    return np.column_stack([x, y])
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n_loop = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_array = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+
+    rng = np.random.default_rng(123)
+    df = pd.DataFrame(
+        {
+            "longitude": rng.uniform(139.3, 140.0, n_array),
+            "latitude": rng.uniform(35.5, 36.0, n_array),
+        }
+    )
+
+    xy_loop, t_loop = timeit(bench_iterrows, df.head(n_loop))
+    xy_array, t_array = timeit(bench_array, df)
+    max_err = np.abs(xy_loop - xy_array[:n_loop]).max()
+
+    lat, lon = calc_lat_lon_array(xy_array[:, 0], xy_array[:, 1], PHI0_DEG, LAMBDA0_DEG)
+    max_err_inv = max(
+        np.abs(lat - df["latitude"].to_numpy()).max(),
+        np.abs(lon - df["longitude"].to_numpy()).max(),
+    )
+
+    print(f"iterrows: {n_loop:>9} pts  {t_loop:.3f}s  {n_loop / t_loop:,.0f} pts/s")
+    print(f"array   : {n_array:>9} pts  {t_array:.3f}s  {n_array / t_array:,.0f} pts/s")
+    print(f"speedup : {(n_array / t_array) / (n_loop / t_loop):,.0f}x")
+    print(f"max |Δxy| vs loop: {max_err:.3e} m, round-trip max |Δdeg|: {max_err_inv:.3e}")
@@ -0,0 +1,39 @@
+"""OR-Tools へのコールバック登録"""
+
+import numpy as np
+
+
+def index_to_node_array(manager):
+    """ソルバー内部のインデックス → ノード番号の対応表 (int32) を作る"""
+    return np.array(
+        [manager.IndexToNode(i) for i in range(manager.GetNumberOfIndices())],
+        dtype=np.int32,
+    )
+
+
+def register_distance_callback(routing, manager, distance_matrix):
+    """距離コールバックを登録してインデックスを返す
+
+    - list of lists の行列は RegisterTransitMatrix で C++ 側に渡すため、
+      探索中に Python が呼ばれない。
+    - それ以外 (KNearestDistanceMatrix など) は Python コールバックになるが、
+      IndexToNode を呼ばずに事前計算した対応表を引く。
+    """
+    if isinstance(distance_matrix, np.ndarray):
+        distance_matrix = distance_matrix.astype(int).tolist()
+    if isinstance(distance_matrix, list):
+        return routing.RegisterTransitMatrix(distance_matrix)
+
+    # numpy のスカラー取り出しより list の方が速いので list にしておく
+    index_to_node = index_to_node_array(manager).tolist()
+    get = distance_matrix.get
+
+    def distance_callback(from_index, to_index):
+        return get(index_to_node[from_index], index_to_node[to_index])
+
+    return routing.RegisterTransitCallback(distance_callback)
+
+
+def register_demand_callback(routing, demands):
+    """需要コールバックを RegisterUnaryTransitVector で登録してインデックスを返す"""
+    return routing.RegisterUnaryTransitVector([int(d) for d in demands])
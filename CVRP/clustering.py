@@ -0,0 +1,320 @@
+"""世帯のクラスタリング (cluster.R の k-means を Python で行う)
+
+data/household5000.dbf を直接読み、k-means の結果を CSV を経由せずに
+ソルバーへ渡せる配列で返す。
+"""
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from ortools.graph.python import min_cost_flow
+
+from calc_xy import calc_xy_array
+from grs80 import LAMBDA0_DEG, PHI0_DEG
+from shapefile_io import read_dbf
+from spatial_join import enrich_households
+from store import save_store
+
+HOUSEHOLD_DBF = "data/household5000.dbf"
+
+# 距離計算をこの行数ずつに分けてメモリを抑える
+_CHUNK = 1 << 18
+
+
+def assign_labels(points, centers):
+    """各点に最も近い重心の番号と、その二乗距離を返す
+
+    |x - c|^2 = |x|^2 - 2 x·c + |c|^2 を行列積で計算する。
+    """
+    labels = np.empty(len(points), dtype=np.int32)
+    min_d2 = np.empty(len(points))
+    c2 = (centers**2).sum(axis=1)
+    for start in range(0, len(points), _CHUNK):
+        chunk = points[start : start + _CHUNK]
+        d2 = c2 - 2.0 * (chunk @ centers.T)
+        chunk_labels = d2.argmin(axis=1)
+        labels[start : start + _CHUNK] = chunk_labels
+        min_d2[start : start + _CHUNK] = np.maximum(
+            d2[np.arange(len(chunk)), chunk_labels] + np.einsum("ij,ij->i", chunk, chunk),
+            0.0,
+        )
+    return labels, min_d2
+
+
+def _init_centers(points, k, rng):
+    """k-means++ で初期重心を選ぶ"""
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.integers(len(points))]
+    d2 = ((points - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = d2.sum()
+        if total == 0:
+            centers[i:] = centers[0]
+            break
+        centers[i] = points[rng.choice(len(points), p=d2 / total)]
+        d2 = np.minimum(d2, ((points - centers[i]) ** 2).sum(axis=1))
+    return centers
+
+
+def _lloyd(points, centers, max_iter, tol):
+    k = len(centers)
+    labels = None
+    for _ in range(max_iter):
+        new_labels, min_d2 = assign_labels(points, centers)
+        # 割り当てが変わらなければ収束
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        new_centers = np.column_stack(
+            [np.bincount(labels, weights=points[:, j], minlength=k) for j in range(2)]
+        )
+        empty = counts == 0
+        new_centers[~empty] /= counts[~empty, np.newaxis]
+        # 空になったクラスタは最も遠い点に置き直す
+        if empty.any():
+            far = np.argsort(min_d2)[::-1][: empty.sum()]
+            new_centers[empty] = points[far]
+        shift = ((new_centers - centers) ** 2).sum()
+        centers = new_centers
+        if shift <= tol:
+            break
+    return centers
+
+
+def _mini_batch(points, centers, max_iter, tol, batch_size, rng):
+    k = len(centers)
+    counts = np.zeros(k)
+    for _ in range(max_iter):
+        batch = points[rng.integers(len(points), size=batch_size)]
+        labels, _ = assign_labels(batch, centers)
+        old = centers.copy()
+        batch_counts = np.bincount(labels, minlength=k)
+        batch_sums = np.column_stack(
+            [np.bincount(labels, weights=batch[:, j], minlength=k) for j in range(2)]
+        )
+        counts += batch_counts
+        hit = batch_counts > 0
+        # 各重心への累計割当数で重み付けした移動平均
+        centers[hit] += (
+            batch_sums[hit] - batch_counts[hit, np.newaxis] * centers[hit]
+        ) / counts[hit, np.newaxis]
+        if ((centers - old) ** 2).sum() <= tol:
+            break
+    return centers
+
+
+def _single_run(points, k, seed, max_iter, tol, batch_size):
+    rng = np.random.default_rng(seed)
+    centers = _init_centers(points, k, rng)
+    if batch_size and batch_size < len(points):
+        centers = _mini_batch(points, centers, max_iter, tol, batch_size, rng)
+        # 全点での Lloyd を数回だけ行って仕上げる
+        centers = _lloyd(points, centers, 3, tol)
+    else:
+        centers = _lloyd(points, centers, max_iter, tol)
+    labels, min_d2 = assign_labels(points, centers)
+    return labels, centers, min_d2.sum()
+
+
+def kmeans(
+    points,
+    k=10,
+    nstart=25,
+    max_iter=100,
+    tol=1e-12,
+    batch_size=None,
+    seed=123,
+    workers=1,
+):
+    """k-means (kmeans(coords, centers = k, nstart = nstart) 相当)
+
+    - input:
+        points: (N, 2) の座標
+        nstart: 初期値を変えて試す回数 (最もSSEの小さい結果を採用)
+        batch_size: 指定するとミニバッチ k-means (大規模データ向け)
+        workers: 試行を並列に行うスレッド数
+    - output:
+        labels: 0始まりのクラスタ番号 (N,)
+        centers: 重心 (k, 2)
+        inertia: クラスタ内二乗和
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    seeds = np.random.SeedSequence(seed).spawn(nstart)
+
+    def run(s):
+        return _single_run(points, k, s, max_iter, tol, batch_size)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            runs = list(executor.map(run, seeds))
+    else:
+        runs = [run(s) for s in seeds]
+    return min(runs, key=lambda r: r[2])
+
+
+def balanced_assign(points, centers, min_size=0, max_size=None):
+    """各クラスタの点数を min_size 以上 max_size 以下に保ったまま、
+    二乗距離の合計が最小になる割り当てを最小費用流で求める
+    """
+    n, k = len(points), len(centers)
+    if max_size is None:
+        max_size = n
+    if k * min_size > n or k * max_size < n:
+        raise ValueError(
+            f"{n} points cannot be split into {k} clusters of size "
+            f"{min_size}..{max_size}"
+        )
+
+    c2 = (centers**2).sum(axis=1)
+    d2 = c2 - 2.0 * (points @ centers.T) + (points**2).sum(axis=1)[:, np.newaxis]
+    d2 = np.maximum(d2, 0.0)
+    # 費用は整数なので、最大値が 1e9 程度になるよう拡大して丸める
+    scale = 1e9 / max(d2.max(), 1e-300)
+    costs = np.rint(d2 * scale).astype(np.int64).ravel()
+
+    # ノード: 点 0..n-1, クラスタ n..n+k-1, 余り分を受ける sink n+k
+    sink = n + k
+    point_tails = np.repeat(np.arange(n), k)
+    point_heads = n + np.tile(np.arange(k), n)
+    tails = np.concatenate([point_tails, n + np.arange(k)])
+    heads = np.concatenate([point_heads, np.full(k, sink)])
+    capacities = np.concatenate(
+        [np.ones(n * k, dtype=np.int64), np.full(k, max_size - min_size)]
+    )
+    unit_costs = np.concatenate([costs, np.zeros(k, dtype=np.int64)])
+
+    flow = min_cost_flow.SimpleMinCostFlow()
+    arcs = flow.add_arcs_with_capacity_and_unit_cost(
+        tails, heads, capacities, unit_costs
+    )
+    supplies = np.concatenate(
+        [np.ones(n, dtype=np.int64), np.full(k, -min_size), [-(n - k * min_size)]]
+    )
+    flow.set_nodes_supplies(np.arange(n + k + 1), supplies)
+    status = flow.solve()
+    if status != flow.OPTIMAL:
+        raise ValueError(f"balanced assignment failed (status {status})")
+
+    assigned = flow.flows(arcs[: n * k]).reshape(n, k)
+    return assigned.argmax(axis=1).astype(np.int32)
+
+
+def balanced_kmeans(points, k=10, min_size=0, max_size=None, max_iter=30, **kwargs):
+    """クラスタの大きさを min_size..max_size に制約した k-means
+
+    通常の k-means の重心から始め、容量制約付きの割り当て (balanced_assign)
+    と重心の更新を割り当てが変わらなくなるまで繰り返す。
+    戻り値は kmeans と同じ (labels, centers, inertia)。
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    _, centers, _ = kmeans(points, k=k, **kwargs)
+
+    labels = None
+    for _ in range(max_iter):
+        new_labels = balanced_assign(points, centers, min_size, max_size)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        centers = np.column_stack(
+            [np.bincount(labels, weights=points[:, j], minlength=k) for j in range(2)]
+        ) / np.maximum(counts, 1)[:, np.newaxis]
+
+    inertia = ((points - centers[labels]) ** 2).sum()
+    return labels, centers, inertia
+
+
+def cluster_households(
+    path=HOUSEHOLD_DBF,
+    k=10,
+    min_size=None,
+    max_size=None,
+    enrich=False,
+    **kmeans_kwargs,
+):
+    """世帯DBFを読んでクラスタリングし、(世帯, 重心) の列 dict を返す
+
+    cluster.R と同じく経度・緯度でクラスタリングし、クラスタ番号は 1..k。
+    min_size / max_size を指定すると、1営業所あたりの世帯数を制約する。
+    enrich を指定すると、世帯に用途地域と地価の列を空間結合で付ける。
+    どちらにも平面直角座標 x, y を付ける。
+    """
+    households = read_dbf(path)
+    if enrich:
+        enrich_households(households)
+    coords = np.column_stack([households["longitude"], households["latitude"]])
+    if min_size is None and max_size is None:
+        labels, centers_lonlat, _ = kmeans(coords, k=k, **kmeans_kwargs)
+    else:
+        labels, centers_lonlat, _ = balanced_kmeans(
+            coords, k=k, min_size=min_size or 0, max_size=max_size, **kmeans_kwargs
+        )
+    households["cluster"] = labels + 1
+
+    households["x"], households["y"] = calc_xy_array(
+        households["latitude"], households["longitude"], PHI0_DEG, LAMBDA0_DEG
+    )
+    centers = {"longitude": centers_lonlat[:, 0], "latitude": centers_lonlat[:, 1]}
+    centers["x"], centers["y"] = calc_xy_array(
+        centers["latitude"], centers["longitude"], PHI0_DEG, LAMBDA0_DEG
+    )
+    return households, centers
+
+
+def cluster_locations(households, centers, cluster_id):
+    """クラスタの (locations_xy, locations_lonlat) を返す (先頭がデポ)"""
+    mask = households["cluster"] == cluster_id
+    i = cluster_id - 1
+    depot_xy = [centers["x"][i], centers["y"][i]]
+    depot_lonlat = [centers["longitude"][i], centers["latitude"][i]]
+    points_xy = np.column_stack([households["x"][mask], households["y"][mask]])
+    points_lonlat = np.column_stack(
+        [households["longitude"][mask], households["latitude"][mask]]
+    )
+    return np.vstack([depot_xy, points_xy]), np.vstack([depot_lonlat, points_lonlat])
+
+
+def write_csvs(households, centers, out_dir="output"):
+    """cluster.R + calc_xy.py と同じ形式の CSV を書き出す (他のスクリプト用)"""
+    df = pd.DataFrame(households)
+    for cluster_id in range(1, len(centers["x"]) + 1):
+        df[df["cluster"] == cluster_id].to_csv(
+            os.path.join(out_dir, f"cluster{cluster_id:02d}.csv"), index=False
+        )
+    pd.DataFrame(centers).to_csv(os.path.join(out_dir, "centers.csv"), index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nstart", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--min-size", type=int, default=None, help="1営業所あたりの最小世帯数")
+    parser.add_argument("--max-size", type=int, default=None, help="1営業所あたりの最大世帯数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--enrich", action="store_true", help="用途地域と地価を世帯に結合する"
+    )
+    parser.add_argument("--out-dir", default="output")
+    parser.add_argument(
+        "--csv", action="store_true", help="従来形式の CSV も書き出す (cluster.R 互換)"
+    )
+    args = parser.parse_args()
+
+    households, centers = cluster_households(
+        k=args.k,
+        nstart=args.nstart,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        enrich=args.enrich,
+    )
+    print(pd.DataFrame(centers))
+    save_store(households, centers, os.path.join(args.out_dir, "store"))
+    if args.csv:
+        write_csvs(households, centers, args.out_dir)
@@ -0,0 +1,427 @@
+"""1クラスタの CVRP を解くライブラリ API
+
+    solution = solve_cluster(customers_xy, depot_xy, {"limit_seconds": 5})
+    print_solution(solution)
+    write_features(solution.iter_geojson_features(locations_lonlat, cluster_id), path)
+
+入力はすべて引数で受け取り、モジュールのグローバル変数を使わないので
+再入可能 (スレッドから同時に呼んでも互いの状態を壊さない)。ただし探索は
+GIL のもとで1つずつ進むので、スレッドでは速くならない。複数のクラスタを
+並列に解くときはプロセスプール (parallel.run_pool) を使う。結果の Solution は
+ルートと集計値だけを持つ (OR-Tools のオブジェクトを持たない) ので pickle できる。
+cvrp.py / cvrp_unit.py / cvrp_limit_seconds.py / val_k_means.py はこの上の
+薄いドライバ。
+"""
+
+import math
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from ortools.util import optional_boolean_pb2
+
+from callbacks import register_demand_callback, register_distance_callback
+from decompose import decompose_routes
+from fleet import DEFAULT_FLEET, expand_fleet, fleet_usage, set_vehicle_costs
+from matrix_cache import cached_distance_matrix
+from road_network import load_graph, road_distance_matrix, road_metric
+from sparse_distance import KNearestDistanceMatrix
+from telemetry import SolutionTrace
+from time_windows import (
+    HORIZON_SECONDS,
+    SERVICE_SECONDS,
+    add_time_data,
+    add_time_dimension,
+    latest_return,
+)
+from warm_start import solve_from_routes
+
+DEFAULT_PARAMS = {
+    "capacity": 50,
+    # None なら ceil(世帯数 / capacity)
+    "num_vehicles": None,
+    "limit_seconds": 1,
+    "first_solution_strategy": "PATH_CHEAPEST_ARC",
+    "metaheuristic": "GUIDED_LOCAL_SEARCH",
+    # 有効にする LNS 近傍 (local_search_operators の use_<名前>、例: "path_lns") と
+    # LNS 1回あたりの秒数 (None なら OR-Tools の既定)
+    "lns_operators": (),
+    "lns_time_limit": None,
+    # 改善が鈍ったら limit_seconds を待たずに打ち切る
+    "stop_on_plateau": False,
+    # 距離行列 (create_data_model)
+    "sparse_k": None,
+    "road_graph": None,
+    # 顧客ごとの需要と車種表 (fleet.py)。どちらもなければ1世帯1・容量50の車両
+    "demands": None,
+    "fleet": None,
+    "spare_vehicles": 0,
+    # 時間枠 (time_windows.py)。speeds / windows は先頭がデポの配列
+    "time_windows": False,
+    "service_seconds": SERVICE_SECONDS,
+    "speeds": None,
+    "windows": None,
+    "horizon": HORIZON_SECONDS,
+    # 初期解: 車両ごとの顧客ノード列、または data を受け取ってそれを返す関数
+    "initial_routes": None,
+    # 大きなクラスタを扇形に分けて初期解を作る (decompose.py)
+    "decompose_sectors": None,
+    "decompose_above": 0,
+    "decompose_seconds": None,
+    "decompose_workers": 1,
+    # 改善の記録と早期打ち切り (telemetry.py)
+    "trace": False,
+    "stall_seconds": None,
+    "stall_ratio": 0.0,
+}
+
+COLORS = [
+    "#1f77b4",
+    "#ff7f0e",
+    "#2ca02c",
+    "#d62728",
+    "#9467bd",
+    "#8c564b",
+    "#e377c2",
+    "#7f7f7f",
+    "#bcbd22",
+    "#17becf",
+]
+
+
+def make_params(params=None):
+    """DEFAULT_PARAMS に params を上書きした dict を返す (知らないキーは ValueError)"""
+    params = dict(params or {})
+    unknown = sorted(set(params) - set(DEFAULT_PARAMS))
+    if unknown:
+        raise ValueError(f"unknown solver parameter(s): {unknown}")
+    return {**DEFAULT_PARAMS, **params}
+
+
+class Solution:
+    """解いた結果 (車両ごとの顧客ノード列と集計値)"""
+
+    def __init__(
+        self,
+        routes,
+        route_distances,
+        loads,
+        objective,
+        vehicle_types=None,
+        latest_return=None,
+        curve=None,
+        stopped_early=False,
+    ):
+        self.routes = routes
+        self.route_distances = route_distances
+        self.loads = loads
+        self.objective = objective
+        self.vehicle_types = vehicle_types
+        self.latest_return = latest_return
+        # 改善曲線 (経過秒のリスト, 目的関数値のリスト)。trace を指定したときだけ
+        self.curve = curve
+        self.stopped_early = stopped_early
+
+    @classmethod
+    def from_assignment(
+        cls, data, manager, routing, assignment, time_dimension=None, trace=None
+    ):
+        """OR-Tools の解から Solution を作る (距離は弧のコストでなく距離行列から引く)"""
+        matrix = data["distance_matrix"]
+        get = matrix.get if hasattr(matrix, "get") else (lambda i, j: matrix[i][j])
+        depot = data["depot"]
+        routes = solution_routes(manager, routing, assignment)
+        route_distances = []
+        for route in routes:
+            path = [depot] + route + [depot]
+            route_distances.append(int(sum(get(a, b) for a, b in zip(path, path[1:]))))
+        loads = [sum(data["demands"][node] for node in route) for route in routes]
+        return cls(
+            routes,
+            route_distances,
+            loads,
+            assignment.ObjectiveValue(),
+            vehicle_types=data.get("vehicle_types"),
+            latest_return=(
+                latest_return(routing, assignment, time_dimension, data["num_vehicles"])
+                if time_dimension is not None
+                else None
+            ),
+            curve=trace.compact() if trace is not None else None,
+            stopped_early=trace is not None and trace.stopped_early,
+        )
+
+    @property
+    def num_vehicles(self):
+        return len(self.routes)
+
+    @property
+    def distance_m(self):
+        return sum(self.route_distances)
+
+    @property
+    def distance_km(self):
+        return self.distance_m / 1000
+
+    @property
+    def vehicles_used(self):
+        return sum(1 for route in self.routes if route)
+
+    def usage(self):
+        """使った車両の台数を車種ごとに dict で返す (車種表がなければ None)"""
+        if self.vehicle_types is None:
+            return None
+        return fleet_usage({"vehicle_types": self.vehicle_types}, self.routes)
+
+    def iter_geojson_features(self, locations_lonlat, cluster_id):
+        """デポ・顧客の Point とルートの LineString の Feature を1つずつ生成する"""
+        yield depot_feature(locations_lonlat[0], f"Depot {cluster_id}")
+        for i in range(1, len(locations_lonlat)):
+            yield customer_feature(locations_lonlat[i], f"Customer {i}")
+        depot = locations_lonlat[0].tolist()
+        for vehicle_id, route in enumerate(self.routes):
+            yield route_feature(
+                [depot] + [locations_lonlat[node].tolist() for node in route] + [depot],
+                COLORS[(cluster_id - 1) % len(COLORS)],
+                vehicle=vehicle_id,
+            )
+
+
+def depot_feature(lonlat, name):
+    """デポ (営業所) の Point の Feature"""
+    return {
+        "type": "Feature",
+        "properties": {
+            "marker-color": "#FF0000",
+            "marker-size": "large",
+            "marker-symbol": "warehouse",
+            "name": name,
+        },
+        "geometry": {"type": "Point", "coordinates": np.asarray(lonlat).tolist()},
+    }
+
+
+def customer_feature(lonlat, name):
+    """顧客 (世帯) の Point の Feature"""
+    return {
+        "type": "Feature",
+        "properties": {
+            "marker-color": "#00FF00",
+            "marker-size": "small",
+            "marker-symbol": "circle",
+            "name": name,
+        },
+        "geometry": {"type": "Point", "coordinates": np.asarray(lonlat).tolist()},
+    }
+
+
+def route_feature(coordinates, color, **properties):
+    """ルートの LineString の Feature (properties は vehicle などの追加の属性)"""
+    return {
+        "type": "Feature",
+        "properties": {
+            "stroke": color,
+            "stroke-width": 2,
+            "stroke-opacity": 1,
+            **properties,
+            "type": "route",
+        },
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+    }
+
+
+def solution_routes(manager, routing, solution):
+    """解から車両ごとの顧客ノード列 (デポを除く) を取り出す"""
+    routes = []
+    for vehicle_id in range(manager.GetNumberOfVehicles()):
+        index = solution.Value(routing.NextVar(routing.Start(vehicle_id)))
+        route = []
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = solution.Value(routing.NextVar(index))
+        routes.append(route)
+    return routes
+
+
+def create_data_model(locations, params):
+    """データモデルを作成 (locations の先頭がデポ)
+
+    sparse_k を指定すると N×N の行列を作らず、各ノードのk近傍とデポとの
+    距離だけを保持する疎な距離行列を使う (それ以外はその場で計算)。
+    road_graph (道路グラフの .npz のパス) を指定すると、直線距離の代わりに
+    道路距離を使う。
+    fleet (車種表) を渡すと num_vehicles は使わず、車種表を展開した車両
+    (上限のない車種は spare_vehicles 台の予備を足す) で費用[円] を最小化する。
+    需要だけ、または時間枠を指定したときは DEFAULT_FLEET を使う。時間枠が
+    あると積載だけで決めた台数では足りないことがあるので、予備を用意する。
+    """
+    points = np.asarray(locations, dtype=np.float64)
+    sparse_k, road_graph = params["sparse_k"], params["road_graph"]
+
+    data = {}
+    metric = "euclidean"
+    if road_graph:
+        if sparse_k:
+            raise ValueError("sparse_k and road_graph cannot be combined")
+        graph = load_graph(road_graph)
+        metric = road_metric(graph)
+        data["distance_matrix"] = road_distance_matrix(points, graph).tolist()
+    elif sparse_k:
+        data["distance_matrix"] = KNearestDistanceMatrix(points, k=sparse_k)
+    else:
+        data["distance_matrix"] = cached_distance_matrix(points).tolist()
+
+    demands = params["demands"]
+    if demands is None:
+        demands = [1] * (len(points) - 1)
+    data["demands"] = [0] + [int(d) for d in demands]
+
+    capacity = params["capacity"]
+    num_vehicles = params["num_vehicles"] or math.ceil((len(points) - 1) / capacity)
+    fleet = params["fleet"]
+    if fleet is None and (params["demands"] is not None or params["time_windows"]):
+        fleet = DEFAULT_FLEET
+    if fleet is not None:
+        spare_vehicles = params["spare_vehicles"]
+        if params["time_windows"]:
+            spare_vehicles = max(spare_vehicles, num_vehicles)
+        data.update(expand_fleet(fleet, demands, spare_vehicles))
+        num_vehicles = len(data["vehicle_capacities"])
+    else:
+        data["vehicle_capacities"] = [capacity] * num_vehicles
+    data["num_vehicles"] = num_vehicles
+    data["depot"] = 0
+
+    if params["time_windows"]:
+        add_time_data(
+            data,
+            points,
+            params["service_seconds"],
+            speeds=params["speeds"],
+            windows=params["windows"],
+            horizon=params["horizon"],
+            metric=metric,
+        )
+    return data
+
+
+def build_model(data):
+    """data から (manager, routing, 時間の次元 or None) を作る
+
+    data に starts / ends があれば、車両ごとに出発・帰着するデポを変える。
+    """
+    if "starts" in data:
+        # 複数デポ (multi_depot.py): 車両ごとの出発・帰着ノード
+        manager = pywrapcp.RoutingIndexManager(
+            len(data["distance_matrix"]),
+            data["num_vehicles"],
+            data["starts"],
+            data["ends"],
+        )
+    else:
+        manager = pywrapcp.RoutingIndexManager(
+            len(data["distance_matrix"]), data["num_vehicles"], data["depot"]
+        )
+    routing = pywrapcp.RoutingModel(manager)
+
+    if "per_km_costs" in data:
+        set_vehicle_costs(routing, manager, data)
+    else:
+        transit_callback_index = register_distance_callback(
+            routing, manager, data["distance_matrix"]
+        )
+        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    demand_callback_index = register_demand_callback(routing, data["demands"])
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback_index, 0, data["vehicle_capacities"], True, "Capacity"
+    )
+
+    time_dimension = None
+    if "time_matrix" in data:
+        time_dimension = add_time_dimension(routing, manager, data)
+    return manager, routing, time_dimension
+
+
+def search_parameters(params):
+    """params から探索パラメータを作る"""
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = getattr(
+        routing_enums_pb2.FirstSolutionStrategy, params["first_solution_strategy"]
+    )
+    search_parameters.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic, params["metaheuristic"]
+    )
+    search_parameters.time_limit.FromMilliseconds(int(params["limit_seconds"] * 1000))
+    for name in params["lns_operators"]:
+        setattr(
+            search_parameters.local_search_operators,
+            f"use_{name}",
+            optional_boolean_pb2.BOOL_TRUE,
+        )
+    if params["lns_time_limit"] is not None:
+        search_parameters.lns_time_limit.FromMilliseconds(
+            int(params["lns_time_limit"] * 1000)
+        )
+    if params["stop_on_plateau"]:
+        search_parameters.improvement_limit_parameters.improvement_rate_coefficient = 2.5
+        search_parameters.improvement_limit_parameters.improvement_rate_solutions_distance = 100
+    return search_parameters
+
+
+def solve_cluster(points, depot, params=None):
+    """depot を営業所として points (顧客の xy) を巡る CVRP を解く
+
+    params は DEFAULT_PARAMS のうち変えたいものだけの dict。
+    Solution を返す (解がなければ None)。ルートのノード番号は
+    points[j - 1] がノード j (ノード 0 がデポ)。
+    """
+    params = make_params(params)
+    locations = np.vstack(
+        [
+            np.asarray(depot, dtype=np.float64).reshape(1, 2),
+            np.asarray(points, dtype=np.float64).reshape(-1, 2),
+        ]
+    )
+    data = create_data_model(locations, params)
+    manager, routing, time_dimension = build_model(data)
+    search = search_parameters(params)
+
+    initial_routes = params["initial_routes"]
+    if callable(initial_routes):
+        initial_routes = initial_routes(data)
+    if (
+        initial_routes is None
+        and params["decompose_sectors"]
+        and "per_km_costs" not in data
+        and len(locations) > params["decompose_above"]
+    ):
+        # 扇形の解は1世帯1・容量50の前提なので、車種表や時間枠があるときは使わない
+        decompose_seconds = params["decompose_seconds"]
+        initial_routes = decompose_routes(
+            locations,
+            params["decompose_sectors"],
+            params["limit_seconds"] if decompose_seconds is None else decompose_seconds,
+            params["decompose_workers"],
+            params["capacity"],
+        )
+
+    trace = None
+    if params["trace"] or params["stall_seconds"] is not None:
+        trace = SolutionTrace(routing, params["stall_seconds"], params["stall_ratio"])
+    assignment = solve_from_routes(routing, search, initial_routes)
+    if not assignment:
+        return None
+    return Solution.from_assignment(
+        data, manager, routing, assignment, time_dimension, trace
+    )
+
+
+def print_solution(solution):
+    """解の集計を表示"""
+    print(f"Total distance of all routes: {solution.distance_km}km")
+    print(f"Total load of all routes: {sum(solution.loads)}")
+    if solution.vehicle_types is not None:
+        print(f"Total cost of all routes: {solution.objective:,}円")
+        print(f"Vehicles used: {solution.usage()}")
+    if solution.latest_return is not None:
+        print(f"Latest return to depot: {solution.latest_return / 60:.1f}min")
@@ -1,208 +1,148 @@
 """Capacited Vehicles Routing Problem (CVRP)."""
 
-import math
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
-import json
-import pandas as pd
-import numpy as np
-from scipy.spatial import distance_matrix
+import argparse
+import functools
+import os
+from clustering import cluster_households, cluster_locations
+from core import print_solution, solve_cluster
+from geojson_writer import write_features
+import store
+from fleet import load_fleet
+from parallel import print_summary, run_pool
+from time_budget import allocate_by_curves, load_curves, run_with_budget, save_curve
+from time_windows import SERVICE_SECONDS, household_speeds, household_windows
+from warm_start import load_routes_for, routes_path, save_routes
 
-def create_data_model(locations, num_vehicles):
-    """データモデルを作成"""
-    points = np.array(locations)
-    dist_matrix = distance_matrix(points, points).astype(int)
-    
-    data = {}
-    data["distance_matrix"] = dist_matrix.tolist()
-    data["demands"] = [0] + [1] * (len(data["distance_matrix"]) - 1)
-    data["vehicle_capacities"] = [50] * num_vehicles
-    data["num_vehicles"] = num_vehicles
-    data["depot"] = 0
-    return data
+def save_geojson(features, cluster_id, precision=None, seq=False):
+    """GeoJSONを保存 (Featureを1つずつ書き出す)
 
-def print_solution(data, manager, routing, solution):
-    """解を表示"""
-    # print(f"Objective: {solution.ObjectiveValue()}")
-    total_distance = 0
-    total_load = 0
-    for vehicle_id in range(data["num_vehicles"]):
-        index = routing.Start(vehicle_id)
-        plan_output = f"Route for vehicle {vehicle_id}:\n"
-        route_distance = 0
-        route_load = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_load += data["demands"][node_index]
-            plan_output += f" {node_index} Load({route_load}) -> "
-            previous_index = index
-            index = solution.Value(routing.NextVar(index))
-            route_distance += routing.GetArcCostForVehicle(
-                previous_index, index, vehicle_id
-            )
-        plan_output += f" {manager.IndexToNode(index)} Load({route_load})\n"
-        plan_output += f"Distance of the route: {route_distance}m\n"
-        plan_output += f"Load of the route: {route_load}\n"
-        # print(plan_output)
-        total_distance += route_distance
-        total_load += route_load
-    print(f"Total distance of all routes: {total_distance / 1000}km")
-    print(f"Total load of all routes: {total_load}")
+    seq=True なら改行区切りの GeoJSONSeq (.geojsonl) で保存する。
+    """
+    if isinstance(features, dict):
+        features = features["features"]
+    ext = "geojsonl" if seq else "geojson"
+    filename = f"geojson/cluster{cluster_id:02d}.{ext}"
+    write_features(features, filename, precision=precision, seq=seq)
+    print(f"✅GeoJSON saved to {filename}")
 
-def create_geojson(data, manager, routing, solution, locations_lon_lat, cluster_id):
-    """GeoJSONを作成"""
-    features = []
-    
-    # デポのポイント
-    features.append({
-        "type": "Feature",
-        "properties": {
-            "marker-color": "#FF0000",
-            "marker-size": "large",
-            "marker-symbol": "warehouse",
-            "name": f"Depot {cluster_id}",
-        },
-        "geometry": {
-            "type": "Point",
-            "coordinates": locations_lon_lat[0].tolist()
-        }
-    })
-    
-    # 顧客のポイント
-    for i in range(1, len(data["distance_matrix"])):
-        features.append({
-            "type": "Feature",
-            "properties": {
-                "marker-color": "#00FF00",
-                "marker-size": "small",
-                "marker-symbol": "circle",
-                "name": f"Customer {i}",
-            },
-            "geometry": {
-                "type": "Point",
-                "coordinates": locations_lon_lat[i].tolist()
-            }
-        })
-    
-    # ルートのライン
-    colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", 
-              "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"]
-    
-    for vehicle_id in range(data["num_vehicles"]):
-        index = routing.Start(vehicle_id)
-        route = []
-        
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            if node_index < len(locations_lon_lat):
-                route.append(locations_lon_lat[node_index].tolist())
-            index = solution.Value(routing.NextVar(index))
+def load_cluster(cluster_id):
+    """(locations_xy, locations_lonlat) を読み込む (先頭がデポ)
 
-        node_index = manager.IndexToNode(index)
-        if node_index < len(locations_lon_lat):
-            route.append(locations_lon_lat[node_index].tolist())
+    output/store/ があればメモリマップで、なければ output/ の CSV から読む。
+    """
+    return store.load_cluster(cluster_id)
 
-        features.append({
-            "type": "Feature",
-            "properties": {
-                "stroke": colors[cluster_id - 1],  # クラスタIDに応じた色
-                "stroke-width": 2,
-                "stroke-opacity": 1,
-                "vehicle": vehicle_id,
-                "type": "route"
-            },
-            "geometry": {
-                "type": "LineString",
-                "coordinates": route
-            }
-        })
-    
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+def main(
+    cluster_id,
+    sparse_k=None,
+    locations=None,
+    limit_seconds=1,
+    stop_on_plateau=False,
+    precision=None,
+    geojson_seq=False,
+    warm_start=False,
+    trace=False,
+    stall_seconds=None,
+    stall_ratio=0.0,
+    road_graph=None,
+    decompose_sectors=None,
+    decompose_above=0,
+    decompose_seconds=None,
+    decompose_workers=1,
+    demand_column=None,
+    fleet=None,
+    time_windows=False,
+    service_seconds=SERVICE_SECONDS,
+    zone_column=None,
+):
+    """メイン処理 (結果の要約を dict で返す)
 
-def save_geojson(geojson, cluster_id):
-    """GeoJSONを保存"""
-    filename = f"geojson/cluster{cluster_id:02d}.geojson"
-    with open(filename, "w") as f:
-        json.dump(geojson, f, indent=2)
-    print(f"✅GeoJSON saved to {filename}")
+    求解は core.solve_cluster で行い、ここではクラスタのデータを読んで
+    パラメータを組み立て、結果を保存する。
 
-def main(cluster_id):
-    """メイン処理"""
+    locations に (locations_xy, locations_lonlat) を渡すと CSV を読まずにそれを解く。
+    stop_on_plateau を指定すると、改善が鈍った時点で limit_seconds を待たずに打ち切る。
+    precision / geojson_seq は save_geojson に渡す。
+    warm_start を指定すると、前回保存したルート (output/routes/) から探索を始める。
+    解のルートは毎回 output/routes/ に保存する。
+    trace を指定すると、改善した解の時刻と距離を output/curves/ に保存する
+    (車種表を使うときは目的関数が費用[円] なので保存しない)。
+    stall_seconds を指定すると、その秒数のあいだ stall_ratio 以上改善しなければ打ち切る。
+    road_graph は create_data_model に渡す。
+    decompose_sectors を指定すると、ノード数が decompose_above を超えるクラスタは
+    decompose.py で扇形に分けて並列に解き (扇形ごとに decompose_seconds 秒、
+    decompose_workers プロセス)、それを初期解に全体を limit_seconds 秒改善する。
+    decompose_seconds が None なら扇形も limit_seconds 秒ずつ解くので、壁時計の
+    時間は limit_seconds の約2倍 (workers が扇形の数より少なければそれ以上) になる。
+    demand_column を指定すると世帯のその列を需要にする。fleet (車種表の CSV) を
+    指定すると車両の台数と車種も最適化する (需要だけ指定したときは DEFAULT_FLEET)。
+    time_windows を指定すると時間枠と作業時間 (service_seconds 秒) を入れて解く
+    (車種表がなければ DEFAULT_FLEET で台数も最適化する)。
+    移動時間の速度は zone_column (用途地域の列) で地域ごとに変える (time_windows.py)。
+    """
     print(f"\n=== 処理開始: クラスタ {cluster_id} ===")
+    summary = {"cluster": cluster_id, "nodes": None, "vehicles": None, "distance_km": None}
     
     try:
         # データ読み込み
-        df_center = pd.read_csv("output/centers.csv")
-        df = pd.read_csv(f"output/cluster{cluster_id:02d}.csv")
-        
-        # 座標データ準備 (x,y座標系)
-        center_xy = df_center[['x', 'y']].iloc[cluster_id - 1].values
-        cluster_points_xy = df[['x', 'y']].values
-        locations_xy = np.vstack([center_xy.reshape(1, 2), cluster_points_xy])
-        
-        # 座標データ準備 (経度緯度)
-        center_lonlat = df_center[['longitude', 'latitude']].iloc[cluster_id - 1].values
-        cluster_points_lonlat = df[['longitude', 'latitude']].values
-        locations_lonlat = np.vstack([center_lonlat.reshape(1, 2), cluster_points_lonlat])
-        
-        # 車両数計算
-        num_vehicles = math.ceil((len(locations_xy) - 1) / 50)
-        print(f"Number of vehicles: {num_vehicles}")
-        
-        # データモデル作成
-        data = create_data_model(locations_xy, num_vehicles)
-        
-        # ルーティングモデル設定
-        manager = pywrapcp.RoutingIndexManager(
-            len(data["distance_matrix"]), 
-            data["num_vehicles"], 
-            data["depot"]
-        )
-        routing = pywrapcp.RoutingModel(manager)
-        
-        # 距離コールバック
-        def distance_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return data["distance_matrix"][from_node][to_node]
-        
-        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-        
-        # 需要コールバック
-        def demand_callback(from_index):
-            from_node = manager.IndexToNode(from_index)
-            return data["demands"][from_node]
-        
-        demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
-        routing.AddDimensionWithVehicleCapacity(
-            demand_callback_index,
-            0,
-            data["vehicle_capacities"],
-            True,
-            "Capacity",
-        )
-        
+        if locations is None:
+            locations = load_cluster(cluster_id)
+        locations_xy, locations_lonlat = locations
+        summary["nodes"] = len(locations_xy)
+
         # 解法パラメータ設定
-        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-        )
-        search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-        )
-        search_parameters.time_limit.FromSeconds(1)
-        
+        params = {
+            "limit_seconds": limit_seconds,
+            "stop_on_plateau": stop_on_plateau,
+            "sparse_k": sparse_k,
+            "road_graph": road_graph,
+            "decompose_sectors": decompose_sectors,
+            "decompose_above": decompose_above,
+            "decompose_seconds": decompose_seconds,
+            "decompose_workers": decompose_workers,
+            "trace": trace,
+            "stall_seconds": stall_seconds,
+            "stall_ratio": stall_ratio,
+        }
+        if demand_column:
+            params["demands"] = store.load_demands(cluster_id, demand_column)
+        if fleet:
+            params["fleet"] = load_fleet(fleet)
+        if time_windows:
+            params["time_windows"] = True
+            params["service_seconds"] = service_seconds
+            params["speeds"] = household_speeds(cluster_id, zone_column)
+            params["windows"] = household_windows(cluster_id)
+        if warm_start:
+            params["initial_routes"] = functools.partial(
+                load_routes_for, routes_path(cluster_id), locations_lonlat
+            )
+
         # 問題解決
-        solution = routing.SolveWithParameters(search_parameters)
+        solution = solve_cluster(locations_xy[1:], locations_xy[0], params)
+        if solution is not None and solution.stopped_early:
+            print("⏹️ 改善が止まったため打ち切りました")
+        if solution is not None and trace:
+            if solution.vehicle_types is not None:
+                # 車種表があると目的関数は費用[円] なので、距離の曲線と比べられない
+                print("⚠️車種表を使う求解の改善曲線は保存しません (目的関数が距離ではない)")
+            else:
+                seconds, objectives = solution.curve
+                save_curve(cluster_id, seconds, [o / 1000 for o in objectives])
         
         if solution:
-            print_solution(data, manager, routing, solution)
-            geojson = create_geojson(data, manager, routing, solution, locations_lonlat, cluster_id)
-            save_geojson(geojson, cluster_id)
+            # 車両数 (車種表があれば使った台数)
+            print(f"Number of vehicles: {solution.num_vehicles}")
+            summary["vehicles"] = (
+                solution.num_vehicles
+                if solution.vehicle_types is None
+                else solution.vehicles_used
+            )
+            print_solution(solution)
+            summary["distance_km"] = solution.distance_km
+            save_routes(routes_path(cluster_id), solution.routes, locations_lonlat)
+            features = solution.iter_geojson_features(locations_lonlat, cluster_id)
+            save_geojson(features, cluster_id, precision=precision, seq=geojson_seq)
         else:
             print("❌No solution found.")
             
@@ -210,7 +150,193 @@ def main(cluster_id):
         print(f"❌エラー発生: {str(e)}")
     finally:
         print(f"=== 処理完了: クラスタ {cluster_id} ===\n")
+    return summary
 
 if __name__ == "__main__":
-    for cluster_id in range(1, 11):  # クラスタ1～10を処理
-        main(cluster_id)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sparse-k",
+        type=int,
+        default=None,
+        help="k近傍だけを保持する疎な距離行列を使う (大規模クラスタ向け)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="並列に解くプロセス数"
+    )
+    parser.add_argument(
+        "--from-dbf",
+        action="store_true",
+        help="R の CSV を使わず、世帯DBFをその場でクラスタリングして解く "
+        "(--demand-column / --time-windows / --warm-start とは併用できない)",
+    )
+    parser.add_argument(
+        "--min-size", type=int, default=None, help="--from-dbf 時の1営業所あたりの最小世帯数"
+    )
+    parser.add_argument(
+        "--max-size", type=int, default=None, help="--from-dbf 時の1営業所あたりの最大世帯数"
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        help="全クラスタ合計の持ち時間[秒]。クラスタごとの求解時間を自動で配分する",
+    )
+    parser.add_argument(
+        "--allocate",
+        choices=["size", "curves"],
+        default="size",
+        help="--budget の配分方法 (ノード数比例 / cvrp_limit_seconds.py の改善曲線)",
+    )
+    parser.add_argument(
+        "--stop-on-plateau",
+        action="store_true",
+        help="改善が鈍ったクラスタは早めに打ち切り、余った時間を他に回す",
+    )
+    parser.add_argument(
+        "--precision", type=int, default=None, help="GeoJSONの座標を丸める小数桁数"
+    )
+    parser.add_argument(
+        "--geojson-seq",
+        action="store_true",
+        help="改行区切りの GeoJSONSeq (.geojsonl) で出力する",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="前回保存したルートを初期解にする (世帯の増減は挿入・削除で吸収)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="改善した解の時刻と距離を output/curves/ に記録する (--allocate curves 用)",
+    )
+    parser.add_argument(
+        "--stall-seconds",
+        type=float,
+        default=None,
+        help="この秒数のあいだ改善しなければ、そのクラスタの探索を打ち切る",
+    )
+    parser.add_argument(
+        "--stall-ratio",
+        type=float,
+        default=0.0,
+        help="--stall-seconds で改善とみなす最小の改善率 (例: 0.001 = 0.1%%)",
+    )
+    parser.add_argument(
+        "--road-graph",
+        default=None,
+        help="道路グラフ (.npz, road_network.py で作成) の道路距離で解く",
+    )
+    parser.add_argument(
+        "--decompose",
+        type=int,
+        default=None,
+        metavar="SECTORS",
+        help="大きなクラスタを SECTORS 個の扇形に分けて並列に解いてから全体を改善する",
+    )
+    parser.add_argument(
+        "--decompose-above",
+        type=int,
+        default=600,
+        help="--decompose を使うクラスタの最小ノード数",
+    )
+    parser.add_argument(
+        "--decompose-workers",
+        type=int,
+        default=1,
+        help="--decompose の扇形を並列に解くプロセス数",
+    )
+    parser.add_argument(
+        "--decompose-seconds",
+        type=float,
+        default=None,
+        help="--decompose の扇形1つを解く秒数 (省略時は limit_seconds。全体の時間はその分延びる)",
+    )
+    parser.add_argument(
+        "--demand-column",
+        default=None,
+        help="世帯のこの列を需要にする (省略時は1世帯1)",
+    )
+    parser.add_argument(
+        "--fleet",
+        default=None,
+        help="車種表の CSV (容量・固定費・距離単価)。台数と車種も最適化する",
+    )
+    parser.add_argument(
+        "--time-windows",
+        action="store_true",
+        help="時間枠 (世帯の tw_start / tw_end 列、分) と作業時間を入れて解く",
+    )
+    parser.add_argument(
+        "--service-seconds",
+        type=int,
+        default=SERVICE_SECONDS,
+        help="--time-windows 時の1世帯あたりの作業時間[秒]",
+    )
+    parser.add_argument(
+        "--zone-column",
+        default=None,
+        help="--time-windows 時に地域ごとの速度を決める用途地域の列 (例: zoning_用途地域)",
+    )
+    args = parser.parse_args()
+    if args.from_dbf and (args.demand_column or args.time_windows or args.warm_start):
+        # 需要・時間枠・保存したルートはクラスタ番号で保存済みのクラスタから読むので、
+        # その場でクラスタリングし直した世帯とは対応しない
+        parser.error(
+            "--from-dbf cannot be combined with --demand-column, --time-windows or --warm-start"
+        )
+
+    # クラスタ1～10を処理
+    cluster_ids = list(range(1, 11))
+    if args.from_dbf:
+        households, centers = cluster_households(
+            workers=os.cpu_count(), min_size=args.min_size, max_size=args.max_size
+        )
+        locations = [cluster_locations(households, centers, c) for c in cluster_ids]
+    elif args.budget:
+        locations = [load_cluster(c) for c in cluster_ids]
+    else:
+        locations = [None] * len(cluster_ids)
+    tasks = [(c, args.sparse_k, loc) for c, loc in zip(cluster_ids, locations)]
+
+    solve = functools.partial(
+        main,
+        stop_on_plateau=args.stop_on_plateau,
+        precision=args.precision,
+        geojson_seq=args.geojson_seq,
+        warm_start=args.warm_start,
+        trace=args.trace,
+        stall_seconds=args.stall_seconds,
+        stall_ratio=args.stall_ratio,
+        road_graph=args.road_graph,
+        decompose_sectors=args.decompose,
+        decompose_above=args.decompose_above,
+        decompose_seconds=args.decompose_seconds,
+        decompose_workers=args.decompose_workers,
+        demand_column=args.demand_column,
+        fleet=args.fleet,
+        time_windows=args.time_windows,
+        service_seconds=args.service_seconds,
+        zone_column=args.zone_column,
+    )
+    if args.budget:
+        sizes = [len(loc[0]) for loc in locations]
+        if args.allocate == "curves":
+            weights = allocate_by_curves(
+                cluster_ids, sizes, load_curves(cluster_ids), args.budget * args.workers
+            )
+        else:
+            weights = sizes
+        results = run_with_budget(solve, tasks, weights, args.budget, args.workers)
+    else:
+        results = [
+            (summary, elapsed, 1) for summary, elapsed in run_pool(solve, tasks, args.workers)
+        ]
+
+    rows = [
+        dict(summary, seconds=elapsed, limit=limit) for summary, elapsed, limit in results
+    ]
+    print("=== Summary ===")
+    print_summary(rows, ["cluster", "nodes", "vehicles", "distance_km", "limit", "seconds"])
+    total_km = sum(row["distance_km"] or 0 for row in rows)
+    print(f"Total distance of all clusters: {total_km:.3f}km")
@@ -0,0 +1,113 @@
+"""大きなクラスタを扇形に分けて並列に解き、つなげてから全体で改善する
+
+1. 顧客をデポまわりの角度順に並べ、車両の容量の倍数ずつの扇形に分ける
+2. 扇形ごとの小さな CVRP をプロセスプールで並列に解く
+3. 扇形の解をクラスタ全体のノード番号のルートにつなげ、それを初期解に
+   全体のモデルでローカルサーチ (ルート間の移動・交換) をかけて境界を直す
+
+扇形の求解は並列なので、コア数が多いほど同じ壁時計時間で広く探索できる。
+
+    python CVRP/decompose.py --cluster 3 --sectors 4 --workers 4
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+import multi_depot
+from parallel import print_summary, run_pool
+
+
+def split_sectors(locations_xy, num_sectors, capacity=50):
+    """顧客 (ノード 1..) を角度順に num_sectors 個の扇形に分け、ノード番号の配列のリストを返す
+
+    扇形の大きさは capacity の倍数にそろえ、車両が半端に余らないようにする。
+    """
+    depot = locations_xy[0]
+    diff = locations_xy[1:] - depot
+    order = np.argsort(np.arctan2(diff[:, 1], diff[:, 0]), kind="stable") + 1
+    size = math.ceil(math.ceil(len(order) / num_sectors) / capacity) * capacity
+    return [order[start : start + size] for start in range(0, len(order), size)]
+
+
+def sector_routes(locations_xy, sectors, limit_seconds=1, workers=1, capacity=50):
+    """扇形ごとに並列に解き、クラスタ全体のノード番号のルートのリストを返す"""
+    depot = locations_xy[:1]
+    tasks = [
+        (
+            multi_depot.create_data_model(
+                depot,
+                locations_xy[sector],
+                np.ones(len(sector), dtype=int),
+                capacity=capacity,
+            ),
+            "GUIDED_LOCAL_SEARCH",
+            limit_seconds,
+        )
+        for sector in sectors
+    ]
+    routes = []
+    for sector, (result, _) in zip(sectors, run_pool(multi_depot.solve, tasks, workers)):
+        if result is None:
+            raise ValueError("no solution for a sector")
+        # 扇形内のノード j (1..) はクラスタの sector[j - 1]
+        routes += [sector[np.asarray(route, dtype=int) - 1].tolist() for route in result[1]]
+    return routes
+
+
+def decompose_routes(
+    locations_xy, num_sectors=4, limit_seconds=1, workers=1, capacity=50
+):
+    """扇形に分けて解いた初期解 (車両ごとのノード列) を返す
+
+    車両数は扇形ごとの台数の合計 (= len(戻り値))。全体のモデルはこの台数で作る。
+    """
+    sectors = split_sectors(locations_xy, num_sectors, capacity)
+    return sector_routes(locations_xy, sectors, limit_seconds, workers, capacity)
+
+
+def compare(cluster_id, num_sectors, sector_seconds, repair_seconds, workers):
+    """そのまま解いた場合と、分割して解いた場合の総距離と壁時計時間を比べる"""
+    from cvrp import load_cluster, main
+
+    locations = load_cluster(cluster_id)
+    rows = []
+    wall = sector_seconds + repair_seconds
+    for name, kwargs in (
+        ("direct", {"limit_seconds": wall}),
+        (
+            "decompose",
+            {
+                "limit_seconds": repair_seconds,
+                "decompose_sectors": num_sectors,
+                "decompose_seconds": sector_seconds,
+                "decompose_workers": workers,
+            },
+        ),
+    ):
+        start = time.perf_counter()
+        summary = main(cluster_id, locations=locations, **kwargs)
+        rows.append(
+            {
+                "mode": name,
+                "distance_km": summary["distance_km"],
+                "seconds": time.perf_counter() - start,
+            }
+        )
+    print_summary(rows, ["mode", "distance_km", "seconds"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cluster", type=int, default=3)
+    parser.add_argument("--sectors", type=int, default=4)
+    parser.add_argument("--sector-seconds", type=float, default=1, help="扇形ごとの求解時間[秒]")
+    parser.add_argument("--repair-seconds", type=float, default=1, help="全体の改善の時間[秒]")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    compare(
+        args.cluster, args.sectors, args.sector_seconds, args.repair_seconds, args.workers
+    )
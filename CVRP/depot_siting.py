@@ -0,0 +1,172 @@
+"""営業所の立地探索
+
+k-means の重心のまわりに格子状の候補地を並べ、代理モデル (surrogate.py)
+で見積もった配送費と、地価メッシュから引いた用地費の合計で順位を付ける。
+OR-Tools で解くのは上位の候補地だけで、下界が既に解いた最良の費用を
+超える候補地は解かずに飛ばす。
+
+    費用[円] = 1日の総距離[km] × YEN_PER_KM × OPERATING_DAYS + 地価[円/m²] × SITE_AREA_M2
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from calc_lat_lon import calc_lat_lon_array
+from core import solution_routes
+from depot_sweep import DepotSweep
+from fleet import YEN_PER_KM
+from grs80 import LAMBDA0_DEG, PHI0_DEG
+from parallel import print_summary
+from spatial_join import LANDPRICE_BASE, land_price_at
+from store import load_centers, load_cluster
+from surrogate import load_coefficients, radial_km, tour_km
+
+OPERATING_DAYS = 2500  # 償却期間の稼働日数 (250日 × 10年)
+SITE_AREA_M2 = 1000  # 営業所の敷地面積
+
+
+def candidate_grid(center_xy, radius_m=10000, spacing_m=250):
+    """center_xy を中心とする半径 radius_m の円内に spacing_m 間隔の格子点を並べる"""
+    offsets = np.arange(-radius_m, radius_m + spacing_m / 2, spacing_m)
+    dx, dy = np.meshgrid(offsets, offsets)
+    inside = np.hypot(dx, dy) <= radius_m
+    return np.column_stack([dx[inside], dy[inside]]) + np.asarray(center_xy)
+
+
+def score_sites(
+    candidates,
+    customers,
+    capacity=50,
+    landprice_base=LANDPRICE_BASE,
+    yen_per_km=YEN_PER_KM,
+    operating_days=OPERATING_DAYS,
+    site_area_m2=SITE_AREA_M2,
+):
+    """候補地ごとの見積もりを費用の安い順に並べた列 dict で返す
+
+    列は x, y, longitude, latitude, land_price, lower_bound_km,
+    surrogate_km, lower_bound_yen, score_yen。
+    地価メッシュの外の候補地 (海など) は除く。地価の図層がなければ
+    警告を出し、地価を 0 として配送費だけで順位を付ける。
+    """
+    candidates = np.asarray(candidates, dtype=np.float64)
+    latitude, longitude = calc_lat_lon_array(
+        candidates[:, 0], candidates[:, 1], PHI0_DEG, LAMBDA0_DEG
+    )
+
+    land_price = land_price_at(np.column_stack([longitude, latitude]), landprice_base)
+    if land_price is None:
+        print(f"⚠️ {landprice_base}.shp がないため地価を 0 として扱います")
+        land_price = np.zeros(len(candidates))
+    on_mesh = ~np.isnan(land_price)
+
+    radial_coef, tour_coef = load_coefficients()
+    lower_bound_km = radial_km(candidates[on_mesh], customers, capacity)
+    surrogate_km = radial_coef * lower_bound_km + tour_km(customers, tour_coef)
+    km_to_yen = yen_per_km * operating_days
+    site_yen = land_price[on_mesh] * site_area_m2
+
+    table = {
+        "x": candidates[on_mesh, 0],
+        "y": candidates[on_mesh, 1],
+        "longitude": longitude[on_mesh],
+        "latitude": latitude[on_mesh],
+        "land_price": land_price[on_mesh],
+        "lower_bound_km": lower_bound_km,
+        "surrogate_km": surrogate_km,
+        "lower_bound_yen": lower_bound_km * km_to_yen + site_yen,
+        "score_yen": surrogate_km * km_to_yen + site_yen,
+    }
+    order = np.argsort(table["score_yen"], kind="stable")
+    return {name: values[order] for name, values in table.items()}
+
+
+def solve_top(
+    table,
+    customers,
+    top=5,
+    limit_seconds=1,
+    capacity=50,
+    yen_per_km=YEN_PER_KM,
+    operating_days=OPERATING_DAYS,
+    site_area_m2=SITE_AREA_M2,
+):
+    """見積もりの良い順に最大 top 件を OR-Tools で解き、行 dict のリストを返す
+
+    下界 (lower_bound_yen) が既に解いた最良の費用以上の候補地は、
+    解いても勝てないので飛ばす。顧客どうしの距離は DepotSweep で使い回し、
+    一つ前の候補地のルートを初期解にする。
+    """
+    depot_sweep = DepotSweep(customers, capacity)
+    km_to_yen = yen_per_km * operating_days
+
+    rows = []
+    best_yen = np.inf
+    routes = None
+    for i in range(len(table["x"])):
+        if len(rows) >= top:
+            break
+        if table["lower_bound_yen"][i] >= best_yen:
+            continue
+
+        start = time.perf_counter()
+        depot = np.array([table["x"][i], table["y"][i]])
+        manager, routing, solution = depot_sweep.solve(
+            depot, limit_seconds, initial_routes=routes
+        )
+        if not solution:
+            print(f"❌No solution found for candidate {i}.")
+            continue
+        routes = solution_routes(manager, routing, solution)
+
+        total_km = solution.ObjectiveValue() / 1000
+        cost_yen = total_km * km_to_yen + table["land_price"][i] * site_area_m2
+        best_yen = min(best_yen, cost_yen)
+        rows.append(
+            {
+                "rank": i,
+                "x": float(depot[0]),
+                "y": float(depot[1]),
+                "land_price": float(table["land_price"][i]),
+                "surrogate_km": float(table["surrogate_km"][i]),
+                "distance_km": total_km,
+                "cost_yen": cost_yen,
+                "seconds": time.perf_counter() - start,
+            }
+        )
+    return rows
+
+
+def site_cluster(
+    cluster_id, radius_m=10000, spacing_m=250, top=5, limit_seconds=1, capacity=50
+):
+    """クラスタの営業所の立地を探し、(見積もりの表, 解いた候補地の行) を返す"""
+    centers = load_centers()
+    cluster_xy, _ = load_cluster(cluster_id)
+    customers = cluster_xy[1:]
+    center_xy = [centers["x"][cluster_id - 1], centers["y"][cluster_id - 1]]
+
+    table = score_sites(candidate_grid(center_xy, radius_m, spacing_m), customers, capacity)
+    rows = solve_top(table, customers, top, limit_seconds, capacity)
+    return table, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cluster", type=int, default=3)
+    parser.add_argument("--radius", type=float, default=10000, help="探索半径[m]")
+    parser.add_argument("--spacing", type=float, default=250, help="候補地の間隔[m]")
+    parser.add_argument("--top", type=int, default=5, help="OR-Tools で解く候補地の数")
+    parser.add_argument("--limit-seconds", type=int, default=1)
+    args = parser.parse_args()
+
+    table, rows = site_cluster(
+        args.cluster, args.radius, args.spacing, args.top, args.limit_seconds
+    )
+    print(f"{len(table['x'])} candidates scored for cluster {args.cluster}")
+    print_summary(
+        rows,
+        ["rank", "x", "y", "land_price", "surrogate_km", "distance_km", "cost_yen", "seconds"],
+    )
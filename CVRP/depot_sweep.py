@@ -0,0 +1,54 @@
+"""デポ (営業所) の候補地を次々に入れ替えて解くためのAPI
+
+顧客どうしの距離は一度だけ計算し、候補地ごとにはデポの行と列
+(ノード0) だけを差し替える。前の候補地で得たルートを初期解にして探索する。
+"""
+
+import math
+
+import numpy as np
+
+from core import build_model, make_params, search_parameters
+from matrix_cache import cached_distance_matrix
+from warm_start import solve_from_routes
+
+
+class DepotSweep:
+    """同じ顧客集合に対してデポだけを動かして CVRP を解く"""
+
+    def __init__(self, customer_points, vehicle_capacity=50):
+        self.customers = np.asarray(customer_points, dtype=np.float64)
+        n = len(self.customers)
+        self.num_vehicles = math.ceil(n / vehicle_capacity)
+
+        # ノード0 (デポ) の行と列は solve() のたびに埋める
+        block = cached_distance_matrix(self.customers).tolist()
+        self.distance_matrix = [[0] * (n + 1)] + [[0] + row for row in block]
+
+        self.data = {
+            "distance_matrix": self.distance_matrix,
+            "demands": [0] + [1] * n,
+            "vehicle_capacities": [vehicle_capacity] * self.num_vehicles,
+            "num_vehicles": self.num_vehicles,
+            "depot": 0,
+        }
+
+    def set_depot(self, depot_xy):
+        """デポの行・列だけを depot_xy からの距離に置き換える (O(N))"""
+        diff = self.customers - np.asarray(depot_xy, dtype=np.float64)
+        depot_row = np.hypot(diff[:, 0], diff[:, 1]).astype(int).tolist()
+        self.distance_matrix[0][1:] = depot_row
+        for row, d in zip(self.distance_matrix[1:], depot_row):
+            row[0] = d
+
+    def solve(self, depot_xy, limit_seconds=1, initial_routes=None):
+        """depot_xy をデポにして解き、(manager, routing, solution) を返す
+
+        initial_routes (車両ごとの顧客ノード列) を渡すと、それを初期解にする。
+        モデルと探索パラメータは core.solve_cluster と同じものを使う。
+        """
+        self.set_depot(depot_xy)
+        manager, routing, _ = build_model(self.data)
+        search = search_parameters(make_params({"limit_seconds": limit_seconds}))
+        solution = solve_from_routes(routing, search, initial_routes)
+        return manager, routing, solution
@@ -0,0 +1,134 @@
+"""車種の混在した車両 (容量・固定費・距離単価) と世帯ごとの需要
+
+車種表は CSV で、列は次のとおり:
+
+    name,capacity,fixed_cost,per_km_cost,max_count
+    light,30,8000,80,
+    standard,50,12000,100,
+    large,80,18000,130,4
+
+- fixed_cost: 1台使うごとの費用[円]
+- per_km_cost: 1km 走るごとの費用[円]
+- max_count: 使える台数の上限 (空欄なら、その車種だけで全需要を運べる台数)
+
+使わない車両は費用 0 なので、固定費と距離費の合計が最小になる台数と車種の
+組み合わせをソルバーが選ぶ (ceil(n / 50) 台に固定しない)。
+目的関数の単位は円になる。
+"""
+
+import numpy as np
+import pandas as pd
+
+from callbacks import register_distance_callback
+
+YEN_PER_KM = 100  # 1km 走るごとの費用 (燃料・人件費)
+
+FLEET_COLUMNS = ["name", "capacity", "fixed_cost", "per_km_cost"]
+
+# 車種表を指定しないときの車両 (需要だけを世帯の列から取るとき)
+DEFAULT_FLEET = {
+    "name": np.array(["standard"]),
+    "capacity": np.array([50]),
+    "fixed_cost": np.array([0]),
+    "per_km_cost": np.array([YEN_PER_KM]),
+    "max_count": np.array([np.nan]),
+}
+
+
+def load_fleet(path):
+    """車種表の CSV を列 dict で読む"""
+    df = pd.read_csv(path)
+    missing = [name for name in FLEET_COLUMNS if name not in df.columns]
+    if missing:
+        raise ValueError(f"fleet table {path} has no column(s) {missing}")
+    if "max_count" not in df.columns:
+        df["max_count"] = np.nan
+    return {name: df[name].to_numpy() for name in FLEET_COLUMNS + ["max_count"]}
+
+
+def bins_needed(demands, capacity):
+    """First Fit Decreasing で demands を詰めたときの台数 (需要を運びきれる台数の上界)"""
+    loads = []
+    for demand in sorted(demands, reverse=True):
+        for i, load in enumerate(loads):
+            if load + demand <= capacity:
+                loads[i] += demand
+                break
+        else:
+            loads.append(demand)
+    return len(loads)
+
+
+def expand_fleet(fleet, demands, spare_vehicles=0):
+    """車種表を車両ごとの list (容量・固定費・距離単価・車種名) に展開する
+
+    max_count が空欄の車種は bins_needed + spare_vehicles 台用意する。
+    """
+    demands = np.asarray(demands)
+    if len(demands) and demands.max() > fleet["capacity"].max():
+        raise ValueError(
+            f"demand {demands.max()} exceeds the largest capacity {fleet['capacity'].max()}"
+        )
+    vehicles = {
+        "vehicle_capacities": [],
+        "fixed_costs": [],
+        "per_km_costs": [],
+        "vehicle_types": [],
+    }
+    for name, capacity, fixed_cost, per_km_cost, max_count in zip(
+        fleet["name"],
+        fleet["capacity"],
+        fleet["fixed_cost"],
+        fleet["per_km_cost"],
+        fleet["max_count"],
+    ):
+        fits = demands[demands <= capacity].tolist()
+        if np.isnan(max_count):
+            count = bins_needed(fits, capacity) + spare_vehicles
+        else:
+            count = int(max_count)
+        vehicles["vehicle_capacities"] += [int(capacity)] * count
+        vehicles["fixed_costs"] += [int(fixed_cost)] * count
+        vehicles["per_km_costs"] += [float(per_km_cost)] * count
+        vehicles["vehicle_types"] += [str(name)] * count
+    return vehicles
+
+
+class ScaledDistance:
+    """distance_matrix.get(i, j) を factor 倍して整数にする (疎な距離行列用)"""
+
+    def __init__(self, distance_matrix, factor):
+        self.distance_matrix = distance_matrix
+        self.factor = factor
+
+    def get(self, i, j):
+        return int(round(self.distance_matrix.get(i, j) * self.factor))
+
+
+def scale_matrix(distance_matrix, factor):
+    """距離[m] の行列を factor 倍した整数の行列にする"""
+    if isinstance(distance_matrix, list):
+        return (np.asarray(distance_matrix) * factor).round().astype(np.int64).tolist()
+    return ScaledDistance(distance_matrix, factor)
+
+
+def set_vehicle_costs(routing, manager, data):
+    """車両ごとの距離費[円] (単価ごとに1つのコールバック) と固定費[円] を設定する"""
+    callbacks = {}
+    for vehicle_id, per_km_cost in enumerate(data["per_km_costs"]):
+        if per_km_cost not in callbacks:
+            callbacks[per_km_cost] = register_distance_callback(
+                routing, manager, scale_matrix(data["distance_matrix"], per_km_cost / 1000)
+            )
+        routing.SetArcCostEvaluatorOfVehicle(callbacks[per_km_cost], vehicle_id)
+        routing.SetFixedCostOfVehicle(data["fixed_costs"][vehicle_id], vehicle_id)
+
+
+def fleet_usage(data, routes):
+    """使った車両の台数を車種ごとに dict で返す (routes は車両ごとの顧客ノード列)"""
+    usage = {}
+    for vehicle_type, route in zip(data["vehicle_types"], routes):
+        usage.setdefault(vehicle_type, 0)
+        if route:
+            usage[vehicle_type] += 1
+    return usage
@@ -0,0 +1,54 @@
+"""GeoJSON をストリーミングで書き出す
+
+Feature を1つずつ書き出すので、FeatureCollection 全体の dict を
+メモリに作らなくてよい。区切り文字を詰め、座標の桁数も丸められる。
+"""
+
+import json
+
+_SEPARATORS = (",", ":")
+
+
+def round_coordinates(coordinates, precision):
+    """座標 (入れ子のリスト) を小数 precision 桁に丸める"""
+    if isinstance(coordinates, (list, tuple)):
+        return [round_coordinates(c, precision) for c in coordinates]
+    return round(float(coordinates), precision)
+
+
+def _dumps(feature, precision):
+    if precision is not None:
+        geometry = feature["geometry"]
+        feature = dict(
+            feature,
+            geometry=dict(
+                geometry,
+                coordinates=round_coordinates(geometry["coordinates"], precision),
+            ),
+        )
+    return json.dumps(feature, separators=_SEPARATORS, ensure_ascii=False)
+
+
+def write_features(features, filename, precision=None, seq=False):
+    """Feature のイテラブルを filename に書き出し、書いた件数を返す
+
+    - precision: 座標を丸める小数桁数 (None なら丸めない。6桁で約10cm)
+    - seq: True なら1行1Featureの GeoJSONSeq (改行区切り) で書く
+    """
+    count = 0
+    with open(filename, "w", encoding="utf-8") as f:
+        if seq:
+            for feature in features:
+                f.write(_dumps(feature, precision))
+                f.write("\n")
+                count += 1
+            return count
+
+        f.write('{"type":"FeatureCollection","features":[')
+        for feature in features:
+            if count:
+                f.write(",")
+            f.write(_dumps(feature, precision))
+            count += 1
+        f.write("]}\n")
+    return count
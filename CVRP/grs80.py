@@ -0,0 +1,125 @@
+from functools import lru_cache
+
+import numpy as np
+
+# 定数 (a, F: 世界測地系-測地基準系1980（GRS80）楕円体)
+M0 = 0.9999
+A_RADIUS = 6378137.0
+F_INV = 298.257222101
+
+# 平面直角座標系の原点 (36°, 139°50′)
+PHI0_DEG = 36.0
+LAMBDA0_DEG = 139 + 50 / 60
+
+# 級数の次数 (alpha, beta は 1..5, delta は 1..6)
+_K5 = np.arange(1, 6)
+_K6 = np.arange(1, 7)
+
+
+def _A_array(n):
+    A0 = 1 + (n**2) / 4.0 + (n**4) / 64.0
+    A1 = -(3.0 / 2) * (n - (n**3) / 8.0 - (n**5) / 64.0)
+    A2 = (15.0 / 16) * (n**2 - (n**4) / 4.0)
+    A3 = -(35.0 / 48) * (n**3 - (5.0 / 16) * (n**5))
+    A4 = (315.0 / 512) * (n**4)
+    A5 = -(693.0 / 1280) * (n**5)
+    return np.array([A0, A1, A2, A3, A4, A5])
+
+
+def _alpha_array(n):
+    a1 = (
+        (1.0 / 2) * n
+        - (2.0 / 3) * (n**2)
+        + (5.0 / 16) * (n**3)
+        + (41.0 / 180) * (n**4)
+        - (127.0 / 288) * (n**5)
+    )
+    a2 = (
+        (13.0 / 48) * (n**2)
+        - (3.0 / 5) * (n**3)
+        + (557.0 / 1440) * (n**4)
+        + (281.0 / 630) * (n**5)
+    )
+    a3 = (61.0 / 240) * (n**3) - (103.0 / 140) * (n**4) + (15061.0 / 26880) * (n**5)
+    a4 = (49561.0 / 161280) * (n**4) - (179.0 / 168) * (n**5)
+    a5 = (34729.0 / 80640) * (n**5)
+    return np.array([a1, a2, a3, a4, a5])
+
+
+def _beta_array(n):
+    b1 = (
+        (1.0 / 2) * n
+        - (2.0 / 3) * (n**2)
+        + (37.0 / 96) * (n**3)
+        - (1.0 / 360) * (n**4)
+        - (81.0 / 512) * (n**5)
+    )
+    b2 = (
+        (1.0 / 48) * (n**2)
+        + (1.0 / 15) * (n**3)
+        - (437.0 / 1440) * (n**4)
+        + (46.0 / 105) * (n**5)
+    )
+    b3 = (17.0 / 480) * (n**3) - (37.0 / 840) * (n**4) - (209.0 / 4480) * (n**5)
+    b4 = (4397.0 / 161280) * (n**4) - (11.0 / 504) * (n**5)
+    b5 = (4583.0 / 161280) * (n**5)
+    return np.array([b1, b2, b3, b4, b5])
+
+
+def _delta_array(n):
+    d1 = (
+        2.0 * n
+        - (2.0 / 3) * (n**2)
+        - 2.0 * (n**3)
+        + (116.0 / 45) * (n**4)
+        + (26.0 / 45) * (n**5)
+        - (2854.0 / 675) * (n**6)
+    )
+    d2 = (
+        (7.0 / 3) * (n**2)
+        - (8.0 / 5) * (n**3)
+        - (227.0 / 45) * (n**4)
+        + (2704.0 / 315) * (n**5)
+        + (2323.0 / 945) * (n**6)
+    )
+    d3 = (
+        (56.0 / 15) * (n**3)
+        - (136.0 / 35) * (n**4)
+        - (1262.0 / 105) * (n**5)
+        + (73814.0 / 2835) * (n**6)
+    )
+    d4 = (
+        (4279.0 / 630) * (n**4) - (332.0 / 35) * (n**5) - (399572.0 / 14175) * (n**6)
+    )
+    d5 = (4174.0 / 315) * (n**5) - (144838.0 / 6237) * (n**6)
+    d6 = (601676.0 / 22275) * (n**6)
+    return np.array([d1, d2, d3, d4, d5, d6])
+
+
+@lru_cache(maxsize=None)
+def grs80_coefficients(phi0_deg, lambda0_deg):
+    """原点ごとの級数係数を一度だけ計算する
+    - input:
+        (phi0_deg, lambda0_deg): 平面直角座標系原点の緯度・経度[度]
+    - output:
+        dict: n, A_, S_, alpha(1..5), beta(1..5), delta(1..6), 原点[rad]
+    """
+    phi0_rad = np.deg2rad(phi0_deg)
+
+    n = 1.0 / (2 * F_INV - 1)
+    A_array = _A_array(n)
+    A_ = ((M0 * A_RADIUS) / (1.0 + n)) * A_array[0]  # [m]
+    S_ = ((M0 * A_RADIUS) / (1.0 + n)) * (
+        A_array[0] * phi0_rad + np.dot(A_array[1:], np.sin(2 * phi0_rad * _K5))
+    )  # [m]
+
+    return {
+        "n": n,
+        "A_": A_,
+        "S_": S_,
+        "alpha": _alpha_array(n),
+        "beta": _beta_array(n),
+        "delta": _delta_array(n),
+        "phi0_rad": phi0_rad,
+        "lambda0_rad": np.deg2rad(lambda0_deg),
+    }
@@ -0,0 +1,96 @@
+"""距離行列のディスクキャッシュ
+
+座標とメトリックのハッシュをキーに int32 の距離行列を .npy で保存し、
+次回からはメモリマップで読み込んで行列の計算を省く。
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+from scipy.spatial import distance_matrix
+
+CACHE_DIR = "output/cache"
+MAX_CACHE_BYTES = 1 << 30  # 1 GiB を超えたら古いものから削除
+
+
+def _euclidean(points):
+    return distance_matrix(points, points)
+
+
+def matrix_key(points, metric="euclidean"):
+    """座標配列とメトリック名から内容ハッシュを作る"""
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    h = hashlib.sha1()
+    h.update(metric.encode())
+    h.update(str(points.shape).encode())
+    h.update(points.tobytes())
+    return h.hexdigest()
+
+
+def cache_path(points, metric="euclidean", cache_dir=CACHE_DIR):
+    """points と metric の距離行列のキャッシュファイルのパス"""
+    return os.path.join(cache_dir, f"{matrix_key(points, metric)}.npy")
+
+
+def cached_distance_matrix(
+    points,
+    metric="euclidean",
+    builder=_euclidean,
+    cache_dir=CACHE_DIR,
+    max_bytes=MAX_CACHE_BYTES,
+):
+    """距離行列[m] (int32, 読み取り専用のメモリマップ) を返す
+
+    - input:
+        points: (N, 2) の座標[m]
+        metric: キャッシュキーに含めるメトリック名
+        builder: キャッシュにないときに points から float の行列を作る関数
+    - output:
+        (N, N) の np.memmap (int32)
+    """
+    path = cache_path(points, metric, cache_dir)
+    try:
+        matrix = np.load(path, mmap_mode="r")
+        os.utime(path)  # 最終利用時刻を更新 (LRU削除のため)
+        return matrix
+    except (FileNotFoundError, ValueError):
+        pass
+
+    matrix = builder(np.asarray(points, dtype=np.float64)).astype(np.int32)
+    os.makedirs(cache_dir, exist_ok=True)
+    # 並列実行時に書きかけのファイルを読まないよう、一時ファイル経由で置き換える
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".npy.tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, path)
+
+    evict(cache_dir, max_bytes, keep=path)
+    return np.load(path, mmap_mode="r")
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """合計サイズが max_bytes 以下になるまで、最後に使われたのが古い順に削除する"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npy"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,271 @@
+"""全クラスタを1つのモデルで解く複数デポ CVRP
+
+各営業所 (centers.csv の重心) を出発・帰着点とする車両を用意し、
+全世帯を1つの RoutingIndexManager で解く。車両は共有のフリートで、
+クラスタの境界を越えてどの営業所の車両でもどの世帯に行ける。
+
+- ノード 0..K-1 が営業所、K 以降が世帯
+- 車両数は営業所ごとに ceil(クラスタの世帯数 / 50) (+ spare)
+- 数千ノードの N×N 行列を作らないよう、疎な距離行列 (KNearestDistanceMatrix) を使う
+- 初期解はクラスタごとに並列に解いた解をつなげたもの。数千ノードでは
+  OR-Tools の初期解法より速く、結果はクラスタごとの解の合計より長くならない
+- workers > 1 ならメタヒューリスティクスを変えた試行をプロセスプールで
+  並列に解き、最も短いものを採用する
+
+    python CVRP/multi_depot.py --limit-seconds 60 --workers 4
+"""
+
+import argparse
+import glob
+import math
+
+import numpy as np
+
+import core  # core は decompose 経由でこのモジュールを読むので、属性は呼ぶときに引く
+import store
+from geojson_writer import write_features
+from matrix_cache import cached_distance_matrix
+from parallel import print_summary, run_pool
+from sparse_distance import KNearestDistanceMatrix
+from surrogate import load_solution
+from warm_start import solve_from_routes
+
+# workers > 1 のときに並列に試すメタヒューリスティクス
+METAHEURISTICS = [
+    "GUIDED_LOCAL_SEARCH",
+    "SIMULATED_ANNEALING",
+    "TABU_SEARCH",
+    "GENERIC_TABU_SEARCH",
+]
+
+def load_all_clusters():
+    """(営業所の xy, 営業所の経度緯度, 世帯の xy, 世帯の経度緯度, 世帯のクラスタ番号) を返す"""
+    centers = store.load_centers()
+    num_clusters = len(centers["x"])
+    points_xy, points_lonlat, clusters = [], [], []
+    for cluster_id in range(1, num_clusters + 1):
+        locations_xy, locations_lonlat = store.load_cluster(cluster_id)
+        points_xy.append(locations_xy[1:])
+        points_lonlat.append(locations_lonlat[1:])
+        clusters.append(np.full(len(locations_xy) - 1, cluster_id))
+    depots_xy = np.column_stack([centers["x"], centers["y"]])
+    depots_lonlat = np.column_stack([centers["longitude"], centers["latitude"]])
+    return (
+        depots_xy,
+        depots_lonlat,
+        np.vstack(points_xy),
+        np.vstack(points_lonlat),
+        np.concatenate(clusters),
+    )
+
+
+def create_data_model(
+    depots_xy, customers_xy, clusters, capacity=50, spare_vehicles=0, sparse_k=None
+):
+    """複数デポのデータモデルを作成
+
+    営業所 d の車両は ceil(クラスタ d+1 の世帯数 / capacity) + spare_vehicles 台で、
+    starts / ends はその営業所のノード番号。
+    """
+    num_depots = len(depots_xy)
+    points = np.vstack([depots_xy, customers_xy])
+    sizes = np.bincount(clusters, minlength=num_depots + 1)[1:]
+    vehicles_per_depot = [math.ceil(n / capacity) + spare_vehicles for n in sizes]
+    depot_of_vehicle = np.repeat(np.arange(num_depots), vehicles_per_depot).tolist()
+
+    data = {}
+    if sparse_k:
+        data["distance_matrix"] = KNearestDistanceMatrix(
+            points, k=sparse_k, depot=list(range(num_depots))
+        )
+    else:
+        data["distance_matrix"] = cached_distance_matrix(points).tolist()
+    data["demands"] = [0] * num_depots + [1] * len(customers_xy)
+    data["num_vehicles"] = len(depot_of_vehicle)
+    data["vehicle_capacities"] = [capacity] * data["num_vehicles"]
+    data["starts"] = depot_of_vehicle
+    data["ends"] = depot_of_vehicle
+    data["num_depots"] = num_depots
+    return data
+
+
+def cluster_routes(data, depots_xy, customers_xy, clusters, limit_seconds=1, workers=1):
+    """クラスタごとに別々に解き、(全体のモデルでのルート, 総距離[m]) を返す
+
+    クラスタごとの求解は run_pool で並列に行い、ノード番号と車両を
+    全体のモデルのものに並べ直す。
+    """
+    num_depots = data["num_depots"]
+    members = [np.flatnonzero(clusters == d + 1) for d in range(num_depots)]
+    tasks = [
+        (
+            create_data_model(
+                depots_xy[d : d + 1],
+                customers_xy[members[d]],
+                np.ones(len(members[d]), dtype=int),
+            ),
+            "GUIDED_LOCAL_SEARCH",
+            limit_seconds,
+        )
+        for d in range(num_depots)
+    ]
+    routes = [[] for _ in range(data["num_vehicles"])]
+    total = 0
+    vehicles = np.asarray(data["starts"])
+    for d, (result, _) in enumerate(run_pool(solve, tasks, workers)):
+        if result is None:
+            raise ValueError(f"no solution for cluster {d + 1}")
+        total += result[0]
+        # クラスタ内のノード j (1..) は全体の members[d][j - 1] + num_depots
+        for vehicle_id, route in zip(np.flatnonzero(vehicles == d), result[1]):
+            nodes = members[d][np.asarray(route, dtype=int) - 1] + num_depots
+            routes[vehicle_id] = nodes.tolist()
+    return routes, total
+
+
+def solve(
+    data,
+    metaheuristic="GUIDED_LOCAL_SEARCH",
+    limit_seconds=60,
+    initial_routes=None,
+):
+    """data を解き、(総距離[m], 車両ごとのノード列) を返す (解がなければ None)
+
+    initial_routes を渡すとそれを初期解にし、なければ PATH_CHEAPEST_ARC で作る。
+    戻り値は pickle できるのでプロセスプールから返せる。
+    """
+    manager, routing, _ = core.build_model(data)
+    search_parameters = core.search_parameters(
+        core.make_params({"metaheuristic": metaheuristic, "limit_seconds": limit_seconds})
+    )
+    solution = solve_from_routes(routing, search_parameters, initial_routes)
+    if not solution:
+        return None
+    return solution.ObjectiveValue(), core.solution_routes(manager, routing, solution)
+
+
+def solve_portfolio(
+    data, metaheuristics, limit_seconds=60, initial_routes=None, workers=1
+):
+    """メタヒューリスティクスごとに解き、最も短い (総距離, ルート, 手法) を返す"""
+    results = run_pool(
+        solve,
+        [(data, m, limit_seconds, initial_routes) for m in metaheuristics],
+        workers,
+    )
+    rows = []
+    best = None
+    for metaheuristic, (result, elapsed) in zip(metaheuristics, results):
+        distance_km = None if result is None else result[0] / 1000
+        rows.append(
+            {"metaheuristic": metaheuristic, "distance_km": distance_km, "seconds": elapsed}
+        )
+        if result is not None and (best is None or result[0] < best[0]):
+            best = (result[0], result[1], metaheuristic)
+    print_summary(rows, ["metaheuristic", "distance_km", "seconds"])
+    return best
+
+
+def iter_geojson_features(data, routes, depots_lonlat, customers_lonlat):
+    """営業所・世帯・ルートの Feature を1つずつ生成する (ルートは営業所の色)"""
+    num_depots = data["num_depots"]
+    for d, lonlat in enumerate(depots_lonlat):
+        yield core.depot_feature(lonlat, f"Depot {d + 1}")
+    for i, lonlat in enumerate(customers_lonlat):
+        yield core.customer_feature(lonlat, f"Customer {i + 1}")
+    for vehicle_id, route in enumerate(routes):
+        if not route:
+            continue
+        depot = data["starts"][vehicle_id]
+        coordinates = (
+            [depots_lonlat[depot].tolist()]
+            + [customers_lonlat[node - num_depots].tolist() for node in route]
+            + [depots_lonlat[data["ends"][vehicle_id]].tolist()]
+        )
+        yield core.route_feature(
+            coordinates,
+            core.COLORS[depot % len(core.COLORS)],
+            vehicle=vehicle_id,
+            depot=depot + 1,
+        )
+
+
+def per_cluster_total_km(pattern="geojson/cluster[0-9][0-9].geojson"):
+    """cvrp.py がクラスタごとに解いた結果の総距離[km] の合計を返す (なければ None)"""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        return None
+    return sum(load_solution(path)[2] for path in paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--limit-seconds", type=float, default=60, help="全体のモデルの求解時間[秒]"
+    )
+    parser.add_argument(
+        "--cluster-seconds",
+        type=float,
+        default=1,
+        help="初期解を作るためのクラスタごとの求解時間[秒]",
+    )
+    parser.add_argument(
+        "--sparse-k",
+        type=int,
+        default=30,
+        help="k近傍だけを保持する疎な距離行列を使う (0 で密な行列)",
+    )
+    parser.add_argument(
+        "--spare-vehicles", type=int, default=0, help="営業所ごとに追加する車両数"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="並列に解くプロセス数"
+    )
+    parser.add_argument("--output", default="geojson/multi_depot.geojson")
+    args = parser.parse_args()
+
+    depots_xy, depots_lonlat, customers_xy, customers_lonlat, clusters = (
+        load_all_clusters()
+    )
+    data = create_data_model(
+        depots_xy,
+        customers_xy,
+        clusters,
+        spare_vehicles=args.spare_vehicles,
+        sparse_k=args.sparse_k,
+    )
+    print(
+        f"{data['num_depots']} depots, {len(customers_xy)} households, "
+        f"{data['num_vehicles']} vehicles"
+    )
+
+    initial_routes, initial_total = cluster_routes(
+        data,
+        depots_xy,
+        customers_xy,
+        clusters,
+        args.cluster_seconds,
+        args.workers,
+    )
+    print(f"Sum of per-cluster solutions (initial): {initial_total / 1000:.3f}km")
+
+    best = solve_portfolio(
+        data,
+        METAHEURISTICS[: max(args.workers, 1)],
+        args.limit_seconds,
+        initial_routes,
+        args.workers,
+    )
+    if best is None:
+        print("❌No solution found.")
+    else:
+        objective, routes, metaheuristic = best
+        write_features(
+            iter_geojson_features(data, routes, depots_lonlat, customers_lonlat),
+            args.output,
+        )
+        print(f"✅GeoJSON saved to {args.output}")
+        print(f"Multi-depot total ({metaheuristic}): {objective / 1000:.3f}km")
+        separate_km = per_cluster_total_km()
+        if separate_km is not None:
+            print(f"Sum of per-cluster solutions (geojson/): {separate_km:.3f}km")
@@ -0,0 +1,68 @@
+"""クラスタ・候補地ごとの求解をプロセスプールで並列実行する"""
+
+import contextlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def run_isolated(func, *args, **kwargs):
+    """標準出力をキャプチャしながら func を実行し、(戻り値, ログ, 秒) を返す"""
+    buf = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(buf):
+        result = func(*args, **kwargs)
+    return result, buf.getvalue(), time.perf_counter() - start
+
+
+def iter_pool(func, args_list, workers=1):
+    """args_list の各引数で func を実行し、終わった順に (番号, 戻り値, 秒) を返す
+
+    workers > 1 のときは1つのプロセスプールにすべて投入する。各タスクのログは
+    終わった順にまとめて表示するので、複数クラスタのログが混ざらない。
+    """
+    if workers <= 1:
+        for i, args in enumerate(args_list):
+            start = time.perf_counter()
+            result = func(*args)
+            yield i, result, time.perf_counter() - start
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_isolated, func, *args): i
+            for i, args in enumerate(args_list)
+        }
+        for future in as_completed(futures):
+            result, log, elapsed = future.result()
+            print(log, end="", flush=True)
+            yield futures[future], result, elapsed
+
+
+def run_pool(func, args_list, workers=1):
+    """args_list の各引数で func を実行し、入力順の (戻り値, 秒) のリストを返す
+
+    workers > 1 のときはプロセスプールで並列実行する (iter_pool)。
+    """
+    results = [None] * len(args_list)
+    for i, result, elapsed in iter_pool(func, args_list, workers):
+        results[i] = (result, elapsed)
+    return results
+
+
+def print_summary(rows, columns):
+    """dict のリストを簡単な表にして表示する"""
+    widths = {
+        c: max([len(c)] + [len(_format(row.get(c))) for row in rows]) for c in columns
+    }
+    print(" ".join(f"{c:>{widths[c]}}" for c in columns))
+    for row in rows:
+        print(" ".join(f"{_format(row.get(c)):>{widths[c]}}" for c in columns))
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
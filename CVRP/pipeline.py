@@ -0,0 +1,409 @@
+"""クラスタリングから GeoJSON の書き出しまでを1回で実行する (変わった段階だけ)
+
+段階は依存関係のある DAG で、リポジトリのルートから実行する:
+
+    cluster (--from-dbf のときだけ)  data/household5000.dbf → output/clusterNN.csv, centers.csv
+    project                         CSV (x, y がなければ付ける) → output/store/
+    matrix:NN                       クラスタ NN の距離行列 → output/cache/
+    solve:NN                        クラスタ NN を cvrp.main で解く → geojson/, output/routes/
+    export                          全クラスタの GeoJSON → geojson/all.geojson
+
+各段階は入力 (ファイルの内容・クラスタの座標・パラメータ) の指紋を
+output/pipeline.json に記録し、指紋が同じで出力も記録どおりに残っていれば
+飛ばす。status は run がやり直す段階を stale と表示する。クラスタの座標はクラスタごとに指紋をとるので、1つのクラスタの
+CSV を直したときは、そのクラスタの matrix / solve と export だけをやり直す。
+
+    python CVRP/pipeline.py run --limit-seconds 1 --workers 4
+    python CVRP/pipeline.py status
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from parallel import print_summary, run_pool
+
+STATE_PATH = "output/pipeline.json"
+OUT_DIR = "output"
+STORE_DIR = "output/store"
+GEOJSON_DIR = "geojson"
+HOUSEHOLD_DBF = "data/household5000.dbf"
+
+
+class Stage:
+    """DAG の1段階
+
+    inputs は指紋をとる材料 (ファイルのパス・配列・パラメータの dict) のリストを、
+    outputs は出力のパスのリストを返す関数で、どちらも依存する段階が終わって
+    から呼ぶ。func(*args) はプロセスプールで実行するので、モジュールの関数と
+    pickle できる引数にする。
+    """
+
+    def __init__(self, name, func, args=(), inputs=list, outputs=list, deps=()):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.deps = list(deps)
+
+
+def file_digest(path):
+    """ファイル (ディレクトリなら中のファイルすべて) の内容の sha1"""
+    h = hashlib.sha1()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".tmp"):
+                    continue
+                file_path = os.path.join(root, name)
+                h.update(os.path.relpath(file_path, path).encode())
+                h.update(file_digest(file_path).encode())
+        return h.hexdigest()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(name, materials):
+    """段階の名前と入力の材料から指紋を作る"""
+    h = hashlib.sha1(name.encode())
+    for material in materials:
+        if isinstance(material, np.ndarray):
+            h.update(str(material.shape).encode())
+            h.update(np.ascontiguousarray(material, dtype=np.float64).tobytes())
+        elif isinstance(material, dict):
+            h.update(json.dumps(material, sort_keys=True, default=str).encode())
+        elif os.path.exists(material):
+            h.update(material.encode())
+            h.update(file_digest(material).encode())
+        else:
+            h.update(f"missing:{material}".encode())
+    return h.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(stage, key, state):
+    """指紋が記録と同じで、出力がすべて記録どおりに残っているか"""
+    record = state.get(stage.name)
+    if record is None or record["fingerprint"] != key:
+        return False
+    return all(
+        os.path.exists(path) and file_digest(path) == record["outputs"].get(path)
+        for path in stage.outputs()
+    )
+
+
+def levels(stages):
+    """依存の深さごとに段階をまとめる (同じ深さの段階は並列に実行できる)"""
+    depth = {}
+    for stage in stages:  # stages は依存する段階より後に並んでいる
+        depth[stage.name] = 1 + max((depth[d] for d in stage.deps), default=-1)
+    grouped = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+    for stage in stages:
+        grouped[depth[stage.name]].append(stage)
+    return grouped
+
+
+def run(stages, workers=1, force=False, dry_run=False, state_path=STATE_PATH):
+    """古くなった段階だけを実行し、段階ごとの結果の行を返す
+
+    失敗した段階に依存する段階は実行しない (blocked)。
+    dry_run では実行せずに、run で実行する段階を stale とする。クラスタの
+    座標は (ストアが古ければ CSV から) 直接読んで指紋をとるので、古い段階に
+    依存していても座標が変わらないクラスタは skipped になる。古い段階の出力
+    ファイルを入力にする段階は stale、入力がまだ読めない段階は pending。
+    """
+    state = load_state(state_path)
+    status = {}
+    rows = []
+    # dry_run で古いと判定した段階の出力 (これを入力に使う段階も古い)
+    stale_outputs = set()
+    for level in levels(stages):
+        todo = []
+        for stage in level:
+            if any(status[d] in ("failed", "blocked", "pending") for d in stage.deps):
+                status[stage.name] = "pending" if dry_run else "blocked"
+                continue
+            try:
+                materials = stage.inputs()
+            except Exception:
+                if not dry_run:
+                    raise
+                # 依存する段階を実行するまで入力が読めない
+                status[stage.name] = "pending"
+                continue
+            key = fingerprint(stage.name, materials)
+            if any(isinstance(m, str) and m in stale_outputs for m in materials):
+                status[stage.name] = "stale"
+            elif not force and is_fresh(stage, key, state):
+                status[stage.name] = "skipped"
+            else:
+                status[stage.name] = "stale"
+                todo.append((stage, key))
+            if dry_run and status[stage.name] == "stale":
+                stale_outputs.update(stage.outputs())
+        if dry_run or not todo:
+            continue
+
+        results = run_pool(
+            _run_stage, [(stage.func, stage.args) for stage, _ in todo], workers
+        )
+        for (stage, key), ((error, _), seconds) in zip(todo, results):
+            if error is not None:
+                print(f"❌{stage.name}: {error}")
+                status[stage.name] = "failed"
+            else:
+                status[stage.name] = "done"
+                state[stage.name] = {
+                    "fingerprint": key,
+                    "outputs": {path: file_digest(path) for path in stage.outputs()},
+                }
+            rows.append({"stage": stage.name, "status": status[stage.name], "seconds": seconds})
+        save_state(state, state_path)
+
+    done = {row["stage"] for row in rows}
+    rows += [
+        {"stage": name, "status": status[name], "seconds": None}
+        for name in status
+        if name not in done
+    ]
+    order = {stage.name: i for i, stage in enumerate(stages)}
+    return sorted(rows, key=lambda row: order[row["stage"]])
+
+
+def _run_stage(func, args):
+    """func(*args) を実行し、(エラー, 戻り値) を返す (例外でプールを止めない)"""
+    try:
+        return None, func(*args)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None
+
+
+# --- 各段階の処理 (プロセスプールから呼ぶのでモジュールの関数にする) ---
+
+
+def cluster_stage(path, params, out_dir):
+    from clustering import cluster_households, write_csvs
+
+    households, centers = cluster_households(path, **params)
+    write_csvs(households, centers, out_dir)
+
+
+def project_stage(out_dir, store_dir):
+    from calc_xy import ensure_xy_columns
+    from store import csv_to_store
+
+    csv_to_store(out_dir, store_dir, transform=ensure_xy_columns)
+
+
+def matrix_stage(cluster_id, road_graph):
+    from matrix_cache import cached_distance_matrix
+    from road_network import load_graph, road_distance_matrix
+    from store import load_cluster
+
+    points = load_cluster(cluster_id)[0]
+    if road_graph:
+        road_distance_matrix(points, load_graph(road_graph))
+    else:
+        cached_distance_matrix(points)
+
+
+def solve_stage(cluster_id, params):
+    from cvrp import main
+
+    summary = main(cluster_id, **params)
+    if summary["distance_km"] is None:
+        raise RuntimeError(f"no solution for cluster {cluster_id}")
+    return summary
+
+
+def export_stage(paths, output):
+    from geojson_writer import write_features
+
+    def features():
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                yield from json.load(f)["features"]
+
+    count = write_features(features(), output)
+    print(f"✅{count} features saved to {output}")
+
+
+# --- DAG の組み立て ---
+
+
+def _cluster_inputs(cluster_id, params, road_graph):
+    """クラスタの座標 (先頭がデポ)・パラメータ・道路グラフのファイル"""
+    from store import load_cluster
+
+    points = np.asarray(load_cluster(cluster_id, STORE_DIR, OUT_DIR)[0])
+    return [points, params] + ([road_graph] if road_graph else [])
+
+
+def _matrix_outputs(cluster_id, road_graph):
+    """クラスタの距離行列のキャッシュファイル"""
+    from matrix_cache import cache_path
+    from road_network import load_graph, road_metric
+    from store import load_cluster
+
+    points = load_cluster(cluster_id, STORE_DIR, OUT_DIR)[0]
+    if road_graph:
+        return [cache_path(points, road_metric(load_graph(road_graph)))]
+    return [cache_path(points)]
+
+
+def _store_sources(out_dir=OUT_DIR):
+    """csv_to_store が読む CSV (centers.csv と、その行数ぶんの clusterNN.csv)
+
+    --clusters で解くクラスタを絞っても、ストアは全クラスタから作るので全部を見る。
+    """
+    import pandas as pd
+
+    centers = os.path.join(out_dir, "centers.csv")
+    if not os.path.exists(centers):
+        return [centers]
+    num_clusters = len(pd.read_csv(centers))
+    return [centers] + [
+        os.path.join(out_dir, f"cluster{c:02d}.csv") for c in range(1, num_clusters + 1)
+    ]
+
+
+def _constant(values):
+    return lambda: list(values)
+
+
+def build_stages(
+    cluster_ids,
+    from_dbf=False,
+    cluster_params=None,
+    solve_params=None,
+    road_graph=None,
+):
+    """段階のリスト (依存する段階が先) を作る"""
+    from warm_start import routes_path
+
+    solve_params = dict(solve_params or {}, road_graph=road_graph)
+    stages = []
+
+    if from_dbf:
+        params = dict(cluster_params or {})
+        stages.append(
+            Stage(
+                "cluster",
+                cluster_stage,
+                (HOUSEHOLD_DBF, params, OUT_DIR),
+                inputs=_constant([HOUSEHOLD_DBF, params]),
+                outputs=_store_sources,
+            )
+        )
+    stages.append(
+        Stage(
+            "project",
+            project_stage,
+            (OUT_DIR, STORE_DIR),
+            inputs=_store_sources,
+            outputs=_constant([STORE_DIR]),
+            deps=["cluster"] if from_dbf else [],
+        )
+    )
+
+    geojsons = []
+    for c in cluster_ids:
+        solve_deps = ["project"]
+        if not solve_params.get("sparse_k"):
+            # 疎な距離行列では N×N の行列を作らない
+            stages.append(
+                Stage(
+                    f"matrix:{c:02d}",
+                    matrix_stage,
+                    (c, road_graph),
+                    inputs=functools.partial(_cluster_inputs, c, {}, road_graph),
+                    outputs=functools.partial(_matrix_outputs, c, road_graph),
+                    deps=["project"],
+                )
+            )
+            solve_deps = [f"matrix:{c:02d}"]
+        geojson = os.path.join(GEOJSON_DIR, f"cluster{c:02d}.geojson")
+        geojsons.append(geojson)
+        stages.append(
+            Stage(
+                f"solve:{c:02d}",
+                solve_stage,
+                (c, solve_params),
+                inputs=functools.partial(_cluster_inputs, c, solve_params, road_graph),
+                outputs=_constant([geojson, routes_path(c)]),
+                deps=solve_deps,
+            )
+        )
+
+    output = os.path.join(GEOJSON_DIR, "all.geojson")
+    stages.append(
+        Stage(
+            "export",
+            export_stage,
+            (geojsons, output),
+            inputs=_constant(geojsons),
+            outputs=_constant([output]),
+            deps=[f"solve:{c:02d}" for c in cluster_ids],
+        )
+    )
+    return stages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument(
+        "--clusters", type=int, nargs="+", default=list(range(1, 11)), help="解くクラスタ"
+    )
+    parser.add_argument(
+        "--from-dbf",
+        action="store_true",
+        help="cluster.R の CSV を使わず、世帯DBFをクラスタリングする段階から実行する",
+    )
+    parser.add_argument("--min-size", type=int, default=None)
+    parser.add_argument("--max-size", type=int, default=None)
+    parser.add_argument("--limit-seconds", type=float, default=1.0)
+    parser.add_argument("--sparse-k", type=int, default=None)
+    parser.add_argument("--road-graph", default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="指紋によらずすべて実行する")
+    args = parser.parse_args()
+
+    stages = build_stages(
+        args.clusters,
+        from_dbf=args.from_dbf,
+        cluster_params={"min_size": args.min_size, "max_size": args.max_size},
+        solve_params={"limit_seconds": args.limit_seconds, "sparse_k": args.sparse_k},
+        road_graph=args.road_graph,
+    )
+    start = time.perf_counter()
+    rows = run(
+        stages, workers=args.workers, force=args.force, dry_run=args.command == "status"
+    )
+    print("=== Pipeline ===")
+    print_summary(rows, ["stage", "status", "seconds"])
+    if args.command == "run":
+        print(f"Total: {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,260 @@
+"""道路ネットワーク上の距離 (オフラインの道路グラフ)
+
+直線距離の代わりに、ディスク上の道路グラフでの最短距離を距離行列にする。
+
+- 道路グラフは OSM の抽出 (.osm XML) から build_from_osm で一度だけ作り、
+  平面直角座標のノードと有向辺の .npz として保存する
+- 世帯は最大の強連結成分の最寄りノードにスナップし、スナップ距離を足す
+- 多対多の距離表は、世帯のまわり (既定で 3km) に切り出したグラフで、
+  出発ノードをまとめた scipy の Dijkstra をプロセスプールで並列に回して作る
+- 結果は matrix_cache に "road:<グラフのハッシュ>" をメトリック名として保存する
+
+    python CVRP/road_network.py data/kanto.osm data/road_graph.npz
+"""
+
+import argparse
+import functools
+import hashlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+
+from calc_xy import calc_xy_array
+from grs80 import LAMBDA0_DEG, PHI0_DEG
+from matrix_cache import cached_distance_matrix
+
+ROAD_GRAPH = "data/road_graph.npz"
+
+# 車が通る道路の highway タグ
+DRIVABLE = {
+    "motorway",
+    "trunk",
+    "primary",
+    "secondary",
+    "tertiary",
+    "unclassified",
+    "residential",
+    "living_street",
+    "service",
+    "motorway_link",
+    "trunk_link",
+    "primary_link",
+    "secondary_link",
+    "tertiary_link",
+}
+
+# Dijkstra の結果 (出発ノード数 × グラフのノード数) をこの要素数ずつに抑える
+_CHUNK = 1 << 24
+
+
+class RoadGraph:
+    """平面直角座標のノードと有向辺 (長さ[m]) からなる道路グラフ"""
+
+    def __init__(self, node_xy, tails, heads, lengths):
+        self.node_xy = np.asarray(node_xy, dtype=np.float64)
+        tails = np.asarray(tails, dtype=np.int64)
+        heads = np.asarray(heads, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.float64)
+
+        # 同じ向きの辺が複数あれば最も短いものだけ残す
+        order = np.lexsort((lengths, heads, tails))
+        tails, heads, lengths = tails[order], heads[order], lengths[order]
+        first = np.ones(len(tails), dtype=bool)
+        first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+        self.tails, self.heads, self.lengths = tails[first], heads[first], lengths[first]
+
+        n = len(self.node_xy)
+        self.graph = csr_matrix((self.lengths, (self.tails, self.heads)), shape=(n, n))
+
+        # 行き止まりの一方通行などに世帯を置かないよう、最大の強連結成分にだけスナップする
+        _, labels = connected_components(self.graph, directed=True, connection="strong")
+        self.snap_nodes = np.flatnonzero(labels == np.bincount(labels).argmax())
+        self._tree = cKDTree(self.node_xy[self.snap_nodes])
+
+        h = hashlib.sha1()
+        for array in (self.node_xy, self.tails, self.heads, self.lengths):
+            h.update(np.ascontiguousarray(array).tobytes())
+        self.key = h.hexdigest()
+
+    @classmethod
+    def load(cls, path=ROAD_GRAPH):
+        with np.load(path) as f:
+            return cls(f["node_xy"], f["tails"], f["heads"], f["lengths"])
+
+    def save(self, path=ROAD_GRAPH):
+        np.savez(
+            path,
+            node_xy=self.node_xy,
+            tails=self.tails,
+            heads=self.heads,
+            lengths=self.lengths,
+        )
+
+    def crop(self, points, margin_m):
+        """points の外接矩形を margin_m 広げた範囲のノードだけのグラフを返す"""
+        points = np.asarray(points, dtype=np.float64)
+        lo = points.min(axis=0) - margin_m
+        hi = points.max(axis=0) + margin_m
+        keep = np.all((self.node_xy >= lo) & (self.node_xy <= hi), axis=1)
+        new_id = np.cumsum(keep) - 1
+        edges = keep[self.tails] & keep[self.heads]
+        return RoadGraph(
+            self.node_xy[keep],
+            new_id[self.tails[edges]],
+            new_id[self.heads[edges]],
+            self.lengths[edges],
+        )
+
+    def snap(self, points):
+        """各点の最寄りノード番号と、そこまでの直線距離[m] を返す"""
+        offsets, idx = self._tree.query(np.asarray(points, dtype=np.float64))
+        return self.snap_nodes[idx], offsets
+
+    def distance_table(self, points, workers=1, margin_m=None):
+        """points どうしの道路距離[m] の (N, N) 行列を返す
+
+        同じノードにスナップした点はまとめて1回だけ Dijkstra を回す。
+        margin_m を指定すると、points のまわりだけに切り出したグラフで解く
+        (都市圏全体のグラフで1クラスタを解くときに速い)。
+        行列は一方通行があると非対称になる。
+        """
+        if margin_m is not None:
+            return self.crop(points, margin_m).distance_table(points, workers)
+        nodes, offsets = self.snap(points)
+        unique_nodes, inverse = np.unique(nodes, return_inverse=True)
+
+        batch = max(1, _CHUNK // len(self.node_xy))
+        batches = [
+            unique_nodes[start : start + batch]
+            for start in range(0, len(unique_nodes), batch)
+        ]
+        run = functools.partial(_shortest_paths, targets=unique_nodes)
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(self.graph,)
+            ) as executor:
+                blocks = list(executor.map(run, batches))
+        else:
+            _init_worker(self.graph)
+            blocks = [run(sources) for sources in batches]
+        table = np.vstack(blocks)[np.ix_(inverse, inverse)]
+
+        table += offsets[:, np.newaxis] + offsets[np.newaxis, :]
+        np.fill_diagonal(table, 0.0)
+        return table
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _shortest_paths(sources, targets):
+    return dijkstra(_worker_graph, directed=True, indices=sources)[:, targets]
+
+
+def _iter_osm(path, tag):
+    """OSM の XML から tag の要素を順に返す
+
+    返した要素と、それまでに読んだルート直下の要素はすぐ捨てるので、
+    ファイルの大きさによらずメモリはほぼ一定。
+    """
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end" or elem.tag not in ("node", "way", "relation"):
+            continue
+        if elem.tag == tag:
+            yield elem
+        elem.clear()
+        root.clear()
+
+
+def build_from_osm(path, drivable=DRIVABLE):
+    """OSM の XML (.osm) から車の通れる道路の RoadGraph を作る
+
+    oneway=yes/1/true と環状交差点は一方通行、oneway=-1 は逆向きの一方通行とする。
+    1回目の読み込みで道路の辺を集め、2回目で道路に使われるノードの座標だけを読む。
+    """
+    tails, heads = [], []
+    for elem in _iter_osm(path, "way"):
+        tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+        if tags.get("highway") in drivable:
+            refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+            oneway = tags.get("oneway", "no")
+            if oneway == "-1":
+                refs.reverse()
+            forward_only = oneway in ("yes", "1", "true", "-1") or (
+                tags.get("junction") == "roundabout"
+            )
+            tails += refs[:-1]
+            heads += refs[1:]
+            if not forward_only:
+                tails += refs[1:]
+                heads += refs[:-1]
+
+    road_nodes = set(tails)
+    road_nodes.update(heads)
+    node_lonlat = {}
+    for elem in _iter_osm(path, "node"):
+        ref = int(elem.get("id"))
+        if ref in road_nodes:
+            node_lonlat[ref] = (float(elem.get("lon")), float(elem.get("lat")))
+    del road_nodes
+
+    used = np.unique(np.concatenate([tails, heads])) if tails else np.zeros(0, np.int64)
+    used = used[[ref in node_lonlat for ref in used.tolist()]]
+    lonlat = np.array([node_lonlat[ref] for ref in used.tolist()]).reshape(-1, 2)
+    x, y = calc_xy_array(lonlat[:, 1], lonlat[:, 0], PHI0_DEG, LAMBDA0_DEG)
+    node_xy = np.column_stack([x, y])
+
+    # OSM の ID をノード番号 0..n-1 に振り直す (ノードのない辺は捨てる)
+    tails, heads = np.asarray(tails), np.asarray(heads)
+    known = np.isin(tails, used) & np.isin(heads, used)
+    tails = np.searchsorted(used, tails[known])
+    heads = np.searchsorted(used, heads[known])
+    lengths = np.hypot(*(node_xy[heads] - node_xy[tails]).T)
+    return RoadGraph(node_xy, tails, heads, lengths)
+
+
+@functools.lru_cache(maxsize=None)
+def load_graph(path=ROAD_GRAPH):
+    """道路グラフを読み込む (プロセスごとに1回だけ)"""
+    return RoadGraph.load(path)
+
+
+def road_metric(graph, margin_m=3000):
+    """matrix_cache のキーに使うメトリック名"""
+    return f"road:{graph.key}:{margin_m}"
+
+
+def road_distance_matrix(points, graph, workers=1, margin_m=3000):
+    """道路距離の行列[m] (int32, メモリマップ) を返す (matrix_cache でキャッシュ)"""
+    return cached_distance_matrix(
+        points,
+        metric=road_metric(graph, margin_m),
+        builder=functools.partial(
+            graph.distance_table, workers=workers, margin_m=margin_m
+        ),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("osm", help="OSM の XML (.osm)")
+    parser.add_argument("output", nargs="?", default=ROAD_GRAPH)
+    args = parser.parse_args()
+
+    graph = build_from_osm(args.osm)
+    graph.save(args.output)
+    print(
+        f"✅{len(graph.node_xy)} nodes, {len(graph.tails)} edges "
+        f"({len(graph.snap_nodes)} in the largest component) saved to {args.output}"
+    )
@@ -0,0 +1,204 @@
+"""シェープファイル (.shp/.shx/.dbf) を R を使わずに NumPy 配列として読み込む
+
+どのファイルもメモリマップで開き、必要なレコード範囲 [start, stop) だけを
+デコードするので、メモリに載らない大きさのファイルも少しずつ読める。
+"""
+
+import os
+import struct
+
+import numpy as np
+
+# シェープタイプ
+NULL_SHAPE = 0
+POINT = 1
+POLYLINE = 3
+POLYGON = 5
+
+
+def read_dbf_header(path):
+    """DBFヘッダを読み、(レコード数, ヘッダ長, レコード長, フィールド一覧) を返す
+
+    フィールドは (名前, 型, 長さ, 小数桁) のタプル。
+    """
+    with open(path, "rb") as f:
+        header = f.read(32)
+        num_records, header_len, record_len = struct.unpack("<IHH", header[4:12])
+        fields = []
+        while True:
+            desc = f.read(32)
+            if not desc or desc[0] == 0x0D:
+                break
+            name = desc[:11].split(b"\0")[0].decode("ascii")
+            fields.append((name, chr(desc[11]), desc[16], desc[17]))
+    return num_records, header_len, record_len, fields
+
+
+def read_dbf(path, columns=None, encoding=None, start=0, stop=None, keep_deleted=False):
+    """DBFの属性を列ごとの NumPy 配列の dict で返す
+
+    レコード本体はメモリマップで読み、[start, stop) の範囲の必要な列だけを変換する。
+    N/F 型は float64 (小数桁0なら int64, 空欄があれば float64 で NaN)、
+    それ以外は str の配列になる。encoding を省略すると .cpg、なければ UTF-8。
+    削除フラグの立ったレコードは除く (.shp と行を揃えるときは keep_deleted=True)。
+    """
+    num_records, header_len, record_len, fields = read_dbf_header(path)
+    dtype = np.dtype(
+        [("_deleted", "S1")] + [(name, f"S{length}") for name, _, length, _ in fields]
+    )
+    assert dtype.itemsize == record_len, f"{path}: record length mismatch"
+    if encoding is None:
+        encoding = _read_cpg(path)
+
+    records = np.memmap(
+        path, dtype=dtype, mode="r", offset=header_len, shape=(num_records,)
+    )[start:stop]
+    alive = (
+        np.ones(len(records), dtype=bool)
+        if keep_deleted
+        else records["_deleted"] != b"*"
+    )
+
+    result = {}
+    for name, field_type, _, decimals in fields:
+        if columns is not None and name not in columns:
+            continue
+        raw = records[name][alive]
+        result[name] = _decode_field(raw, field_type, decimals, encoding)
+    return result
+
+
+def _decode_field(raw, field_type, decimals, encoding):
+    if field_type in ("N", "F"):
+        stripped = np.char.strip(raw)
+        blank = stripped == b""
+        if blank.any():
+            values = np.full(len(raw), np.nan)
+            values[~blank] = stripped[~blank].astype(np.float64)
+            return values
+        return stripped.astype(np.int64 if decimals == 0 else np.float64)
+    return np.char.strip(np.char.decode(raw, encoding))
+
+
+def _read_cpg(path):
+    cpg = os.path.splitext(path)[0] + ".cpg"
+    if os.path.exists(cpg):
+        with open(cpg, encoding="ascii") as f:
+            return f.read().strip() or "utf-8"
+    return "utf-8"
+
+
+def read_shp_header(path):
+    """.shp/.shx のヘッダから (シェープタイプ, bbox(xmin, ymin, xmax, ymax)) を返す"""
+    with open(path, "rb") as f:
+        header = f.read(100)
+    shape_type = struct.unpack("<i", header[32:36])[0]
+    bbox = struct.unpack("<4d", header[36:68])
+    return shape_type, bbox
+
+
+def read_shx(path, start=0, stop=None):
+    """.shx から各レコードの .shp 内バイト位置と内容の長さ[バイト]を返す"""
+    index = np.memmap(path, dtype=">i4", mode="r", offset=100).reshape(-1, 2)[start:stop]
+    return index[:, 0].astype(np.int64) * 2, index[:, 1].astype(np.int64) * 2
+
+
+def num_records(base_path):
+    """レコード数 (.shx があればそこから、なければ .dbf から)"""
+    shx = base_path + ".shx"
+    if os.path.exists(shx):
+        return (os.path.getsize(shx) - 100) // 8
+    return read_dbf_header(base_path + ".dbf")[0]
+
+
+def read_points(base_path, start=0, stop=None):
+    """ポイントのシェープファイルから (N, 2) の座標配列を返す (Null は NaN)"""
+    offsets, _ = read_shx(base_path + ".shx", start, stop)
+    shp = np.memmap(base_path + ".shp", dtype=np.uint8, mode="r")
+
+    # レコードヘッダ8バイト + シェープタイプ4バイトの後に x, y が続く
+    shape_types = shp[offsets[:, np.newaxis] + 8 + np.arange(4)].copy().view("<i4")
+    xy = shp[offsets[:, np.newaxis] + 12 + np.arange(16)].copy().view("<f8")
+    xy[shape_types[:, 0] != POINT] = np.nan
+    return xy
+
+
+def read_polygons(base_path, start=0, stop=None):
+    """ポリゴン/ポリラインのシェープファイルを CSR 形式の配列の dict で返す
+
+    - bbox: (N, 4) 各レコードの (xmin, ymin, xmax, ymax)
+    - part_offsets: (N+1,) レコード i のリングは part_offsets[i]:part_offsets[i+1]
+    - ring_offsets: (R+1,) リング j の点は ring_offsets[j]:ring_offsets[j+1]
+    - points: (P, 2) 全リングの頂点
+    """
+    offsets, lengths = read_shx(base_path + ".shx", start, stop)
+    shp = np.memmap(base_path + ".shp", dtype=np.uint8, mode="r")
+
+    n = len(offsets)
+    bbox = np.full((n, 4), np.nan)
+    part_offsets = np.zeros(n + 1, dtype=np.int64)
+    ring_starts = []
+    point_chunks = []
+    num_points_total = 0
+    num_rings_total = 0
+
+    for i, (offset, length) in enumerate(zip(offsets.tolist(), lengths.tolist())):
+        content = shp[offset + 8 : offset + 8 + length]
+        shape_type = int(content[:4].view("<i4")[0])
+        if shape_type not in (POLYLINE, POLYGON):
+            part_offsets[i + 1] = num_rings_total
+            continue
+        bbox[i] = content[4:36].view("<f8")
+        num_parts, num_points = content[36:44].view("<i4")
+        parts = content[44 : 44 + 4 * num_parts].view("<i4")
+        points_start = 44 + 4 * num_parts
+        points = content[points_start : points_start + 16 * num_points].view("<f8")
+
+        ring_starts.append(parts.astype(np.int64) + num_points_total)
+        point_chunks.append(points.reshape(-1, 2))
+        num_points_total += int(num_points)
+        num_rings_total += int(num_parts)
+        part_offsets[i + 1] = num_rings_total
+
+    ring_offsets = np.append(
+        np.concatenate(ring_starts) if ring_starts else np.zeros(0, dtype=np.int64),
+        num_points_total,
+    )
+    points = np.concatenate(point_chunks) if point_chunks else np.zeros((0, 2))
+    return {
+        "bbox": bbox,
+        "part_offsets": part_offsets,
+        "ring_offsets": ring_offsets,
+        "points": points,
+    }
+
+
+def read_shapefile(base_path, columns=None, start=0, stop=None):
+    """ジオメトリと属性をまとめて読む
+
+    base_path は拡張子なしのパス (例: "data/household5000")。
+    戻り値は属性の列 dict に "geometry" を加えたもの。ポイントなら (N, 2) の配列、
+    ポリゴン/ポリラインなら read_polygons の dict。
+    """
+    shape_type, _ = read_shp_header(base_path + ".shx")
+    if shape_type == POINT:
+        geometry = read_points(base_path, start, stop)
+    elif shape_type in (POLYLINE, POLYGON):
+        geometry = read_polygons(base_path, start, stop)
+    else:
+        raise ValueError(f"{base_path}: unsupported shape type {shape_type}")
+
+    result = {}
+    if os.path.exists(base_path + ".dbf"):
+        result = read_dbf(
+            base_path + ".dbf", columns, start=start, stop=stop, keep_deleted=True
+        )
+    result["geometry"] = geometry
+    return result
+
+
+def iter_shapefile(base_path, chunk_size=100_000, columns=None):
+    """レコードを chunk_size 件ずつ読む (メモリに載らない大きなファイル向け)"""
+    total = num_records(base_path)
+    for start in range(0, total, chunk_size):
+        yield start, read_shapefile(base_path, columns, start, start + chunk_size)
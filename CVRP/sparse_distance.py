@@ -0,0 +1,87 @@
+"""k近傍だけを保持する疎な距離行列"""
+
+import math
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class KNearestDistanceMatrix:
+    """各ノードのk近傍とデポとの距離だけを保持する距離行列
+
+    N×N の行列を作らずに ``matrix[i][j]`` で距離[m]を引けるようにする。
+    保持していない組み合わせはその場で座標から計算する。
+    値は ``distance_matrix(points, points).astype(int)`` と同じ整数[m]。
+    """
+
+    def __init__(self, locations, k=20, depot=0):
+        """depot にノード番号の列を渡すと、複数デポ (各デポの行・列を保持) になる"""
+        self.points = np.asarray(locations, dtype=np.float64)
+        self.depot = depot
+        self.k = min(k, len(self.points) - 1)
+
+        # デポとの距離は行・列とも全ノード分保持する
+        depot_diff = self.points - self.points[depot][..., np.newaxis, :]
+        self._depot_row = np.hypot(depot_diff[..., 0], depot_diff[..., 1]).astype(int)
+        self._depot_list = self._depot_row.tolist()
+        # 複数デポなら {デポのノード番号: 行}
+        self._depot_lists = None
+        if np.ndim(depot):
+            self._depot_lists = dict(zip(np.ravel(depot).tolist(), self._depot_list))
+
+        # KD-treeで各ノードのk近傍を求める (自分自身を含むので k+1)
+        tree = cKDTree(self.points)
+        _, idx = tree.query(self.points, k=self.k + 1)
+        idx = np.asarray(idx).reshape(len(self.points), -1)
+        diff = self.points[idx] - self.points[:, np.newaxis, :]
+        dist = np.hypot(diff[..., 0], diff[..., 1]).astype(int)
+
+        self.neighbors = idx.astype(np.int32)
+        self._rows = [
+            dict(zip(row_idx, row_dist))
+            for row_idx, row_dist in zip(idx.tolist(), dist.tolist())
+        ]
+        self._xy = self.points.tolist()
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, from_node):
+        return _Row(self, from_node)
+
+    def get(self, from_node, to_node):
+        """2ノード間の距離[m]を返す"""
+        if self._depot_lists is None:
+            if from_node == self.depot:
+                return self._depot_list[to_node]
+            if to_node == self.depot:
+                return self._depot_list[from_node]
+        else:
+            row = self._depot_lists.get(from_node)
+            if row is not None:
+                return row[to_node]
+            row = self._depot_lists.get(to_node)
+            if row is not None:
+                return row[from_node]
+        d = self._rows[from_node].get(to_node)
+        if d is None:
+            x1, y1 = self._xy[from_node]
+            x2, y2 = self._xy[to_node]
+            d = int(math.hypot(x2 - x1, y2 - y1))
+        return d
+
+
+class _Row:
+    """``matrix[i][j]`` の書き方を保つための行ビュー"""
+
+    __slots__ = ("_matrix", "_from_node")
+
+    def __init__(self, matrix, from_node):
+        self._matrix = matrix
+        self._from_node = from_node
+
+    def __getitem__(self, to_node):
+        return self._matrix.get(self._from_node, to_node)
+
+    def __len__(self):
+        return len(self._matrix)
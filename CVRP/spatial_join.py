@@ -0,0 +1,258 @@
+"""世帯と面データ (用途地域・地価メッシュ) の空間結合
+
+- 地価の 250m メッシュは規則格子なので、セル番号を計算して直接引く (MeshIndex)
+- 用途地域の任意ポリゴンは STR で詰めた R-tree で候補を絞り (STRtree)、
+  点がポリゴンの内側かをベクトル化した交差判定で確かめる
+"""
+
+import os
+
+import numpy as np
+
+from shapefile_io import read_dbf, read_polygons
+
+ZONING_BASE = "data/関東大都市圏用途地域"
+LANDPRICE_BASE = "data/landprice_250mesh_lit"
+
+# 候補ペア × 辺の判定をこの件数ずつに分けてメモリを抑える
+_EDGE_CHUNK = 1 << 22
+
+
+class MeshIndex:
+    """規則格子のメッシュを (行, 列) → レコード番号の表で引く"""
+
+    def __init__(self, polygons):
+        bbox = polygons["bbox"]
+        valid = ~np.isnan(bbox[:, 0])
+        self.cell_w = float(np.median(bbox[valid, 2] - bbox[valid, 0]))
+        self.cell_h = float(np.median(bbox[valid, 3] - bbox[valid, 1]))
+        self.x0 = float(bbox[valid, 0].min())
+        self.y0 = float(bbox[valid, 1].min())
+
+        # セル中心から行・列を求める
+        cx = (bbox[valid, 0] + bbox[valid, 2]) / 2
+        cy = (bbox[valid, 1] + bbox[valid, 3]) / 2
+        cols = np.floor((cx - self.x0) / self.cell_w).astype(np.int64)
+        rows = np.floor((cy - self.y0) / self.cell_h).astype(np.int64)
+        self.shape = (rows.max() + 1, cols.max() + 1)
+        self.grid = np.full(self.shape, -1, dtype=np.int32)
+        self.grid[rows, cols] = np.flatnonzero(valid)
+
+    def query(self, points):
+        """各点を含むメッシュのレコード番号 (なければ -1) を返す"""
+        cols = np.floor((points[:, 0] - self.x0) / self.cell_w).astype(np.int64)
+        rows = np.floor((points[:, 1] - self.y0) / self.cell_h).astype(np.int64)
+        inside = (
+            (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        )
+        result = np.full(len(points), -1, dtype=np.int32)
+        result[inside] = self.grid[rows[inside], cols[inside]]
+        return result
+
+
+class STRtree:
+    """Sort-Tile-Recursive で詰めた静的 R-tree (bbox の検索用)
+
+    各階層は (bbox, 子の開始位置, 子の終了位置) の配列で、子は次の階層
+    (最下層では self.items) の連続した範囲になるよう並べ替えてある。
+    """
+
+    def __init__(self, bbox, node_capacity=16):
+        self.bbox = bbox
+        valid = ~np.isnan(bbox[:, 0])
+        items = np.flatnonzero(valid)
+        order = _str_order(bbox[items], node_capacity)
+        self.items = items[order]
+        level_bbox = bbox[self.items]
+
+        self.levels = []
+        while True:
+            starts = np.arange(0, len(level_bbox), node_capacity)
+            ends = np.minimum(starts + node_capacity, len(level_bbox))
+            node_bbox = np.column_stack(
+                [
+                    np.minimum.reduceat(level_bbox[:, 0], starts),
+                    np.minimum.reduceat(level_bbox[:, 1], starts),
+                    np.maximum.reduceat(level_bbox[:, 2], starts),
+                    np.maximum.reduceat(level_bbox[:, 3], starts),
+                ]
+            )
+            self.levels.append((node_bbox, starts, ends))
+            if len(node_bbox) <= node_capacity:
+                break
+            # 上の階層を詰めるため、この階層のノードを STR 順に並べ替える
+            order = _str_order(node_bbox, node_capacity)
+            self.levels[-1] = (node_bbox[order], starts[order], ends[order])
+            level_bbox = node_bbox[order]
+        self.levels.reverse()
+
+    def query_points(self, points):
+        """bbox が点を含む (点の番号, アイテム番号) の候補ペアを返す"""
+        root_bbox = self.levels[0][0]
+        point_idx = np.repeat(np.arange(len(points)), len(root_bbox))
+        node_idx = np.tile(np.arange(len(root_bbox)), len(points))
+
+        px, py = points[:, 0], points[:, 1]
+        for node_bbox, starts, ends in self.levels:
+            xmin, ymin, xmax, ymax = node_bbox.T
+            x, y = px[point_idx], py[point_idx]
+            hit = (
+                (x >= xmin[node_idx])
+                & (x <= xmax[node_idx])
+                & (y >= ymin[node_idx])
+                & (y <= ymax[node_idx])
+            )
+            point_idx, node_idx = point_idx[hit], node_idx[hit]
+            # 子の範囲に展開する
+            counts = ends[node_idx] - starts[node_idx]
+            point_idx = np.repeat(point_idx, counts)
+            node_idx = _expand_ranges(starts[node_idx], counts)
+
+        # 最下層の子はアイテム自身の bbox で絞り込む
+        items = self.items[node_idx]
+        xmin, ymin, xmax, ymax = self.bbox[items].T
+        x, y = px[point_idx], py[point_idx]
+        hit = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        return point_idx[hit], items[hit]
+
+
+class PolygonIndex:
+    """STRtree + 点の内外判定で、点を含むポリゴンのレコード番号を求める"""
+
+    def __init__(self, polygons, node_capacity=16):
+        self.polygons = polygons
+        self.tree = STRtree(polygons["bbox"], node_capacity)
+
+        # 各リングの辺 (始点, 終点) をレコードごとに連続して並べる
+        ring_offsets = polygons["ring_offsets"]
+        pts = polygons["points"]
+        is_ring_end = np.zeros(len(pts), dtype=bool)
+        is_ring_end[ring_offsets[1:] - 1] = True
+        edge_start = np.flatnonzero(~is_ring_end)
+        self.edges = np.column_stack([pts[edge_start], pts[edge_start + 1]])
+
+        # レコード i の辺は edge_offsets[i]:edge_offsets[i+1]
+        record_point_end = ring_offsets[polygons["part_offsets"]]
+        self.edge_offsets = np.searchsorted(edge_start, record_point_end)
+
+    def query(self, points):
+        """各点を含むポリゴンのレコード番号 (なければ -1) を返す"""
+        points = np.asarray(points, dtype=np.float64)
+        result = np.full(len(points), -1, dtype=np.int32)
+        point_idx, record_idx = self.tree.query_points(points)
+        if len(point_idx) == 0:
+            return result
+
+        counts = self.edge_offsets[record_idx + 1] - self.edge_offsets[record_idx]
+        pair_ends = np.cumsum(counts)
+        inside = np.zeros(len(point_idx), dtype=bool)
+        # 辺の総数が大きいときは候補ペアを分けて判定する
+        start = 0
+        while start < len(point_idx):
+            limit = (pair_ends[start - 1] if start else 0) + _EDGE_CHUNK
+            stop = max(start + 1, int(np.searchsorted(pair_ends, limit, side="right")))
+            inside[start:stop] = self._contains(
+                points[point_idx[start:stop]],
+                self.edge_offsets[record_idx[start:stop]],
+                counts[start:stop],
+            )
+            start = stop
+
+        # 重なりがあればレコード番号の小さいものを採用 (大きい順に書いて上書きする)
+        point_idx, record_idx = point_idx[inside], record_idx[inside]
+        order = np.argsort(record_idx, kind="stable")[::-1]
+        result[point_idx[order]] = record_idx[order]
+        return result
+
+    def _contains(self, p, edge_starts, counts):
+        """偶奇規則 (レイキャスティング) で点がポリゴンの内側か判定する"""
+        pair = np.repeat(np.arange(len(p)), counts)
+        e = self.edges[_expand_ranges(edge_starts, counts)]
+        px, py = p[pair, 0], p[pair, 1]
+        x1, y1, x2, y2 = e[:, 0], e[:, 1], e[:, 2], e[:, 3]
+        straddle = (y1 > py) != (y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        crossing = straddle & (px < x_cross)
+        return np.bincount(pair, weights=crossing, minlength=len(p)) % 2 == 1
+
+
+def _str_order(bbox, node_capacity):
+    """bbox を Sort-Tile-Recursive の順に並べる添字を返す"""
+    n = len(bbox)
+    cx = (bbox[:, 0] + bbox[:, 2]) / 2
+    cy = (bbox[:, 1] + bbox[:, 3]) / 2
+    num_slices = max(1, int(np.ceil(np.sqrt(np.ceil(n / node_capacity)))))
+    slice_size = num_slices * node_capacity
+    by_x = np.argsort(cx, kind="stable")
+    slice_id = np.empty(n, dtype=np.int64)
+    slice_id[by_x] = np.arange(n) // slice_size
+    return np.lexsort((cy, slice_id))
+
+
+def _expand_ranges(starts, counts):
+    """[starts[i], starts[i] + counts[i]) を連結した添字配列を返す"""
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(total)
+
+
+def join_attributes(points, base_path, index, columns=None, prefix=""):
+    """index で引いたレコードの属性を、点ごとの列 dict にして返す
+
+    該当なしの点は数値列なら NaN、文字列列なら空文字になる。
+    """
+    record = index.query(points)
+    matched = record >= 0
+    attributes = read_dbf(base_path + ".dbf", columns, keep_deleted=True)
+    result = {f"{prefix}record": record}
+    for name, values in attributes.items():
+        if values.dtype.kind in "iuf":
+            column = np.full(len(points), np.nan)
+        else:
+            column = np.full(len(points), "", dtype=values.dtype)
+        column[matched] = values[record[matched]]
+        result[f"{prefix}{name}"] = column
+    return result
+
+
+def land_price_at(points, landprice_base=LANDPRICE_BASE, price_column="los_land_p"):
+    """経度・緯度 (N, 2) の各点の地価を返す (メッシュの外なら NaN)
+
+    .shp がなければ None を返す。
+    """
+    if not os.path.exists(landprice_base + ".shp"):
+        return None
+    mesh = MeshIndex(read_polygons(landprice_base))
+    return join_attributes(points, landprice_base, mesh, [price_column])[price_column]
+
+
+def enrich_households(
+    households,
+    zoning_base=ZONING_BASE,
+    landprice_base=LANDPRICE_BASE,
+    zoning_columns=None,
+    price_column="los_land_p",
+):
+    """世帯の列 dict に用途地域 (zoning_*) と地価 (land_price) の列を加える
+
+    .shp が見つからない図層は警告を出して飛ばす。
+    """
+    points = np.column_stack([households["longitude"], households["latitude"]])
+
+    land_price = land_price_at(points, landprice_base, price_column)
+    if land_price is not None:
+        households["land_price"] = land_price
+    else:
+        print(f"⚠️ {landprice_base}.shp がないため地価の結合を飛ばします")
+
+    if os.path.exists(zoning_base + ".shp"):
+        index = PolygonIndex(read_polygons(zoning_base))
+        households.update(
+            join_attributes(points, zoning_base, index, zoning_columns, "zoning_")
+        )
+    else:
+        print(f"⚠️ {zoning_base}.shp がないため用途地域の結合を飛ばします")
+    return households
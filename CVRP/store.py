@@ -0,0 +1,198 @@
+"""中間データの列指向ストア
+
+世帯 (経度・緯度・sq・クラスタ番号・x・y) と重心を列ごとの .npy として
+output/store/ に保存する。どの段階からもメモリマップで読めるので、
+output/clusterNN.csv を毎回パースする必要がない。
+
+    output/store/households/<列名>.npy   クラスタ番号順に並べた世帯
+    output/store/centers/<列名>.npy      重心 (クラスタ番号 - 1 の順)
+    output/store/cluster_offsets.npy     クラスタ c の世帯は [offsets[c-1], offsets[c])
+    output/store/sources.json            取り込んだ CSV の更新時刻と大きさ (csv_to_store)
+
+CSV から取り込んだストアは、CSV が取り込み後に書き換わっていたら使わずに
+CSV を読む (cluster.R をやり直したのに calc_xy.py を忘れた場合など)。
+"""
+
+import functools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = "output/store"
+
+
+def save_store(households, centers, store_dir=STORE_DIR):
+    """列 dict の世帯と重心をストアに保存する"""
+    order = np.argsort(np.asarray(households["cluster"]), kind="stable")
+    clusters = np.asarray(households["cluster"])[order]
+    num_clusters = len(centers["x"])
+    offsets = np.searchsorted(clusters, np.arange(1, num_clusters + 2))
+
+    for group, columns, index in (
+        ("households", households, order),
+        ("centers", centers, None),
+    ):
+        group_dir = os.path.join(store_dir, group)
+        os.makedirs(group_dir, exist_ok=True)
+        # 前のストアにだけあった列 (前回 --enrich で結合した列など) を消す
+        for name in os.listdir(group_dir):
+            if name.endswith(".npy") and name[: -len(".npy")] not in columns:
+                os.remove(os.path.join(group_dir, name))
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if index is not None:
+                values = values[index]
+            _save_atomic(os.path.join(group_dir, f"{name}.npy"), values)
+    _save_atomic(os.path.join(store_dir, "cluster_offsets.npy"), offsets)
+
+
+def _save_atomic(path, values):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(values))
+    os.replace(tmp_path, path)
+
+
+def has_store(store_dir=STORE_DIR):
+    return os.path.exists(os.path.join(store_dir, "cluster_offsets.npy"))
+
+
+def _csv_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def stale_sources(store_dir=STORE_DIR, out_dir="output"):
+    """取り込み後に変わった (または消えた) CSV の名前のリスト
+
+    sources.json のないストア (clustering.py が直接書いたもの) は CSV と比べない。
+    """
+    path = os.path.join(store_dir, "sources.json")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        sources = json.load(f)
+    stale = []
+    for name, stamp in sources.items():
+        csv_path = os.path.join(out_dir, name)
+        if not os.path.exists(csv_path) or _csv_stamp(csv_path) != stamp:
+            stale.append(name)
+    return stale
+
+
+def use_store(store_dir=STORE_DIR, out_dir="output"):
+    """ストアがあり、取り込んだ CSV から変わっていなければ True"""
+    if not has_store(store_dir):
+        return False
+    stale = stale_sources(store_dir, out_dir)
+    if stale:
+        _warn_stale(store_dir, tuple(stale))
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_stale(store_dir, stale):
+    print(
+        f"⚠️{store_dir} は {', '.join(stale)} の変更より古いので CSV を読みます "
+        "(calc_xy.py をやり直すとストアを作り直します)"
+    )
+
+
+def _load_group(group_dir):
+    return {
+        name[: -len(".npy")]: np.load(os.path.join(group_dir, name), mmap_mode="r")
+        for name in sorted(os.listdir(group_dir))
+        if name.endswith(".npy")
+    }
+
+
+def load_store(store_dir=STORE_DIR):
+    """(世帯, 重心, offsets) をメモリマップした列 dict で返す"""
+    households = _load_group(os.path.join(store_dir, "households"))
+    centers = _load_group(os.path.join(store_dir, "centers"))
+    offsets = np.load(os.path.join(store_dir, "cluster_offsets.npy"))
+    return households, centers, offsets
+
+
+def csv_to_store(out_dir="output", store_dir=STORE_DIR, transform=None):
+    """cluster.R + calc_xy.py が書いた CSV を一度だけストアに取り込む
+
+    transform を渡すと、読み込んだ各 DataFrame をそれで変換してから取り込む。
+    """
+    transform = transform or (lambda df: df)
+    df_center = transform(pd.read_csv(os.path.join(out_dir, "centers.csv")))
+    names = ["centers.csv"] + [
+        f"cluster{cluster_id:02d}.csv" for cluster_id in range(1, len(df_center) + 1)
+    ]
+    df = pd.concat(
+        [transform(pd.read_csv(os.path.join(out_dir, name))) for name in names[1:]],
+        ignore_index=True,
+    )
+    households = {name: df[name].to_numpy() for name in df.columns}
+    centers = {name: df_center[name].to_numpy() for name in df_center.columns}
+    save_store(households, centers, store_dir)
+
+    sources = {name: _csv_stamp(os.path.join(out_dir, name)) for name in names}
+    tmp_path = os.path.join(store_dir, "sources.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(sources, f, indent=1)
+    os.replace(tmp_path, os.path.join(store_dir, "sources.json"))
+
+
+def load_centers(store_dir=STORE_DIR, out_dir="output"):
+    """重心の列 dict を返す (ストアがないか古ければ centers.csv)"""
+    if use_store(store_dir, out_dir):
+        return load_store(store_dir)[1]
+    df_center = pd.read_csv(os.path.join(out_dir, "centers.csv"))
+    return {name: df_center[name].to_numpy() for name in df_center.columns}
+
+
+def load_households(cluster_id, store_dir=STORE_DIR):
+    """クラスタの世帯を列 dict で返す (用途地域・地価などの結合列も含む)"""
+    households, _, offsets = load_store(store_dir)
+    rows = slice(offsets[cluster_id - 1], offsets[cluster_id])
+    return {name: values[rows] for name, values in households.items()}
+
+
+def load_cluster(cluster_id, store_dir=STORE_DIR, out_dir="output"):
+    """クラスタの (locations_xy, locations_lonlat) を返す (先頭がデポ)
+
+    ストアがあればメモリマップした列から切り出し、ないか古ければ CSV を読む。
+    """
+    if use_store(store_dir, out_dir):
+        households, centers, offsets = load_store(store_dir)
+        rows = slice(offsets[cluster_id - 1], offsets[cluster_id])
+        points_xy = np.column_stack([households["x"][rows], households["y"][rows]])
+        points_lonlat = np.column_stack(
+            [households["longitude"][rows], households["latitude"][rows]]
+        )
+    else:
+        centers = load_centers(store_dir, out_dir)
+        df = pd.read_csv(os.path.join(out_dir, f"cluster{cluster_id:02d}.csv"))
+        points_xy = df[["x", "y"]].to_numpy()
+        points_lonlat = df[["longitude", "latitude"]].to_numpy()
+
+    i = cluster_id - 1
+    depot_xy = [centers["x"][i], centers["y"][i]]
+    depot_lonlat = [centers["longitude"][i], centers["latitude"][i]]
+    return np.vstack([depot_xy, points_xy]), np.vstack([depot_lonlat, points_lonlat])
+
+
+def load_column(cluster_id, column, store_dir=STORE_DIR, out_dir="output"):
+    """クラスタの世帯の column 列を返す (デポは含まない。列がなければ KeyError)"""
+    if use_store(store_dir, out_dir):
+        return load_households(cluster_id, store_dir)[column]
+    df = pd.read_csv(os.path.join(out_dir, f"cluster{cluster_id:02d}.csv"))
+    return df[column].to_numpy()
+
+
+def load_demands(cluster_id, column, store_dir=STORE_DIR, out_dir="output"):
+    """クラスタの世帯の column 列を需要 (切り上げた整数) として返す (デポは含まない)"""
+    values = load_column(cluster_id, column, store_dir, out_dir)
+    demands = np.ceil(np.asarray(values, dtype=np.float64)).astype(np.int64)
+    if (demands < 0).any():
+        raise ValueError(f"column {column} has negative demands")
+    return demands
@@ -0,0 +1,175 @@
+"""OR-Tools を解かずに CVRP の総距離を見積もる代理モデル
+
+Daganzo の近似式で、多数の候補デポについてまとめて計算する。
+
+    総距離 ≈ 2 Σ d(デポ, 顧客) / Q  +  k √(n A)
+
+第1項 (放射項) は顧客を車両に積んで往復する分で、容量 Q の
+CVRP の総距離の下界にもなっている。第2項 (巡回項) は顧客どうしを
+回る分で、顧客数 n と顧客が広がる面積 A だけで決まりデポによらない。
+
+2つの項の係数は、geojson/ に保存済みの OR-Tools の解に合わせて
+calibrate() で決め、output/surrogate.json に保存する。
+
+    python CVRP/surrogate.py    # 係数を合わせて誤差を表示する
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+from scipy.optimize import nnls
+from scipy.spatial import ConvexHull, QhullError
+
+from calc_xy import calc_xy_array
+from grs80 import LAMBDA0_DEG, PHI0_DEG
+from parallel import print_summary
+
+# 巡回項の係数 (ユークリッド距離での Beardwood–Halton–Hammersley 定数の目安)
+TOUR_COEF = 0.57
+
+COEF_PATH = "output/surrogate.json"
+SOLUTION_GLOBS = ("geojson/cluster*.geojson", "geojson/move_center/*/*.geojson")
+
+# 候補デポ × 顧客の距離計算をこの要素数ずつに分けてメモリを抑える
+_CHUNK = 1 << 22
+
+
+def radial_km(depots, customers, capacity=50):
+    """各候補デポの放射項 2 Σ d / Q [km] (総距離の下界) を返す
+
+    - input:
+        depots: (D, 2) 候補デポの平面直角座標[m]
+        customers: (N, 2) 顧客の平面直角座標[m]
+        capacity: 1台あたりの積載量 (需要はすべて1)
+    - output:
+        (D,) の配列[km]
+    """
+    depots = np.atleast_2d(np.asarray(depots, dtype=np.float64))
+    customers = np.asarray(customers, dtype=np.float64)
+    total = np.empty(len(depots))
+    rows = max(1, _CHUNK // max(len(customers), 1))
+    for start in range(0, len(depots), rows):
+        chunk = depots[start : start + rows]
+        dx = chunk[:, 0, np.newaxis] - customers[:, 0]
+        dy = chunk[:, 1, np.newaxis] - customers[:, 1]
+        total[start : start + rows] = np.hypot(dx, dy).sum(axis=1)
+    return 2.0 * total / capacity / 1000
+
+
+def tour_km(customers, coef=TOUR_COEF):
+    """巡回項 k √(n A) [km] を返す (A は顧客の凸包の面積)"""
+    customers = np.asarray(customers, dtype=np.float64)
+    try:
+        area = ConvexHull(customers).volume
+    except (QhullError, ValueError):
+        # 点が少ない・一直線に並ぶときは面積 0 とみなす
+        area = 0.0
+    return coef * np.sqrt(len(customers) * area) / 1000
+
+
+def load_coefficients(path=COEF_PATH):
+    """(放射項の係数, 巡回項の係数) を返す (未較正なら (1.0, TOUR_COEF))"""
+    if not os.path.exists(path):
+        return 1.0, TOUR_COEF
+    with open(path) as f:
+        coefs = json.load(f)
+    return coefs["radial"], coefs["tour"]
+
+
+def save_coefficients(coefs, path=COEF_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"radial": coefs[0], "tour": coefs[1]}, f)
+
+
+def estimate_km(depots, customers, capacity=50, coefs=None):
+    """各候補デポの総距離の見積もり[km] を返す
+
+    coefs を省略すると output/surrogate.json の較正済み係数を使う。
+    """
+    radial_coef, tour_coef = load_coefficients() if coefs is None else coefs
+    return radial_coef * radial_km(depots, customers, capacity) + tour_km(
+        customers, tour_coef
+    )
+
+
+def load_solution(path):
+    """GeoJSON に保存した解から (デポ, 顧客, 総距離[km]) を平面直角座標で返す"""
+    with open(path) as f:
+        features = json.load(f)["features"]
+
+    def to_xy(lon_lat):
+        lon_lat = np.asarray(lon_lat, dtype=np.float64).reshape(-1, 2)
+        x, y = calc_xy_array(lon_lat[:, 1], lon_lat[:, 0], PHI0_DEG, LAMBDA0_DEG)
+        return np.column_stack([x, y])
+
+    depot, customers, total_m = None, [], 0.0
+    for feature in features:
+        geometry = feature["geometry"]
+        if geometry["type"] == "LineString":
+            route = to_xy(geometry["coordinates"])
+            total_m += np.hypot(*np.diff(route, axis=0).T).sum()
+        elif feature["properties"].get("marker-symbol") == "warehouse":
+            depot = to_xy(geometry["coordinates"])[0]
+        else:
+            customers.append(geometry["coordinates"])
+    return depot, to_xy(customers), total_m / 1000
+
+
+def calibrate(paths, capacity=50):
+    """保存済みの解に合わせて係数を最小二乗 (非負) で決める
+
+    戻り値は (係数, 解ごとの行 dict のリスト)。行には未較正の式、
+    全件で合わせた式、その解を除いて合わせた式 (leave-one-out) の
+    見積もりと誤差[%] を入れる。
+    """
+    samples = [load_solution(path) for path in paths]
+    features = np.array(
+        [
+            [radial_km(depot, customers, capacity)[0], tour_km(customers, 1.0)]
+            for depot, customers, _ in samples
+        ]
+    )
+    actual = np.array([total_km for _, _, total_km in samples])
+
+    coefs, _ = nnls(features, actual)
+    rows = []
+    for i, path in enumerate(paths):
+        others = np.arange(len(paths)) != i
+        held_out = nnls(features[others], actual[others])[0] if others.any() else coefs
+        predictions = {
+            "daganzo_km": features[i] @ [1.0, TOUR_COEF],
+            "fit_km": features[i] @ coefs,
+            "loo_km": features[i] @ held_out,
+        }
+        row = {"solution": os.path.relpath(path, "geojson"), "actual_km": actual[i]}
+        for name, value in predictions.items():
+            row[name] = float(value)
+            row[name.replace("_km", "_err%")] = float(100 * (value / actual[i] - 1))
+        rows.append(row)
+    return (float(coefs[0]), float(coefs[1])), rows
+
+
+if __name__ == "__main__":
+    paths = sorted(p for pattern in SOLUTION_GLOBS for p in glob.glob(pattern))
+    coefs, rows = calibrate(paths)
+    print_summary(
+        rows,
+        [
+            "solution",
+            "actual_km",
+            "daganzo_km",
+            "daganzo_err%",
+            "fit_km",
+            "fit_err%",
+            "loo_km",
+            "loo_err%",
+        ],
+    )
+    for name in ("daganzo", "fit", "loo"):
+        errors = np.abs([row[f"{name}_err%"] for row in rows])
+        print(f"{name}: mean |error| {errors.mean():.2f}%, max {errors.max():.2f}%")
+    print(f"radial coef {coefs[0]:.4f}, tour coef {coefs[1]:.4f}")
+    save_coefficients(coefs)
@@ -0,0 +1,374 @@
+"""探索パラメータ (初期解の作り方・メタヒューリスティック・秒数・LNS) を掃引する
+
+全クラスタ × 設定の組を core.solve_cluster で解き、結果を SQLite の
+output/sweep.sqlite にためる。同じクラスタ・同じ設定の結果がすでにあれば
+解き直さないので、途中で止めても続きから実行できる (--force で解き直す)。
+リポジトリのルートから実行する:
+
+    python CVRP/sweep.py run --grid --limit-seconds 1 5 --workers 4
+    python CVRP/sweep.py run --random 20 --seed 0 --clusters 1 2 3
+    python CVRP/sweep.py report    # クラスタの大きさ・秒数ごとの最良の設定
+
+設定の良さは、同じクラスタで最も短かった総距離に対する差 (gap) の平均で比べる。
+cvrp_limit_seconds.py は、既定の設定1つを改善曲線つきで解く特別な場合。
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from core import make_params, solve_cluster
+from parallel import iter_pool, print_summary
+from store import load_cluster
+
+DB_PATH = "output/sweep.sqlite"
+
+STRATEGIES = [
+    "PATH_CHEAPEST_ARC",
+    "SAVINGS",
+    "PARALLEL_CHEAPEST_INSERTION",
+    "LOCAL_CHEAPEST_INSERTION",
+    "GLOBAL_CHEAPEST_ARC",
+    "CHRISTOFIDES",
+]
+METAHEURISTICS = [
+    "GUIDED_LOCAL_SEARCH",
+    "SIMULATED_ANNEALING",
+    "TABU_SEARCH",
+    "GREEDY_DESCENT",
+]
+# 既定の近傍に加えて有効にする LNS 近傍の組
+LNS_CHOICES = [(), ("path_lns",), ("path_lns", "tsp_lns", "inactive_lns")]
+LIMIT_SECONDS = [1.0]
+
+# report でクラスタを大きさ (世帯数) で分ける境目
+SIZE_BINS = (300, 500, 700)
+
+CONFIG_KEYS = (
+    "first_solution_strategy",
+    "metaheuristic",
+    "limit_seconds",
+    "lns_operators",
+    "lns_time_limit",
+)
+COLUMNS = (
+    "cluster",
+    "nodes",
+    "config",
+    "first_solution_strategy",
+    "metaheuristic",
+    "limit_seconds",
+    "lns_operators",
+    "lns_time_limit",
+    "distance_km",
+    "objective",
+    "vehicles",
+    "best_at",
+    "seconds",
+    "created",
+)
+
+
+def make_config(config=None):
+    """CONFIG_KEYS だけの設定を既定値で埋める"""
+    config = dict(config or {})
+    unknown = set(config) - set(CONFIG_KEYS)
+    if unknown:
+        raise ValueError(f"unknown sweep options: {sorted(unknown)}")
+    defaults = make_params()
+    config = {key: config.get(key, defaults[key]) for key in CONFIG_KEYS}
+    config["limit_seconds"] = float(config["limit_seconds"])
+    config["lns_operators"] = list(config["lns_operators"])
+    return config
+
+
+def config_key(config):
+    """設定を比べるためのキー (JSON 文字列)"""
+    return json.dumps(make_config(config), sort_keys=True)
+
+
+def grid(
+    strategies=STRATEGIES,
+    metaheuristics=METAHEURISTICS,
+    limits=LIMIT_SECONDS,
+    lns_choices=LNS_CHOICES,
+    lns_time_limit=None,
+):
+    """すべての組み合わせの設定のリスト"""
+    return [
+        make_config(
+            {
+                "first_solution_strategy": s,
+                "metaheuristic": m,
+                "limit_seconds": t,
+                "lns_operators": lns,
+                "lns_time_limit": lns_time_limit,
+            }
+        )
+        for s, m, t, lns in itertools.product(strategies, metaheuristics, limits, lns_choices)
+    ]
+
+
+def random_configs(n, seed=0, **choices):
+    """grid の組み合わせから重複なく n 個を無作為に選ぶ"""
+    configs = grid(**choices)
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(configs), size=min(n, len(configs)), replace=False)
+    return [configs[i] for i in sorted(picked)]
+
+
+def solve_config(cluster_id, config=None, params=None):
+    """クラスタ cluster_id を設定 config で解き、(Solution, 結果の行) を返す
+
+    params は設定以外に core.solve_cluster に渡すパラメータ (trace など)。
+    解がなければ Solution は None で、行の距離は None になる。
+    """
+    config = make_config(config)
+    locations = load_cluster(cluster_id)[0]
+    start = time.perf_counter()
+    solution = solve_cluster(
+        locations[1:], locations[0], dict(params or {}, **config)
+    )
+    row = dict(
+        config,
+        cluster=cluster_id,
+        nodes=len(locations),
+        config=config_key(config),
+        distance_km=None,
+        objective=None,
+        vehicles=None,
+        best_at=None,
+        seconds=time.perf_counter() - start,
+    )
+    if solution:
+        row.update(
+            distance_km=solution.distance_km,
+            objective=solution.objective,
+            vehicles=solution.vehicles_used,
+        )
+        if solution.curve is not None and len(solution.curve[0]):
+            # 最後に解が改善した時刻 (これより長い秒数は無駄になった)
+            row["best_at"] = float(solution.curve[0][-1])
+    return solution, row
+
+
+def run_task(cluster_id, config):
+    """プロセスプールから呼ぶ (結果の行だけを返す)"""
+    return solve_config(cluster_id, config, {"trace": True})[1]
+
+
+def connect(path=DB_PATH):
+    """結果のデータベースを開く (なければ表を作る)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS runs (
+            cluster INTEGER NOT NULL,
+            nodes INTEGER NOT NULL,
+            config TEXT NOT NULL,
+            first_solution_strategy TEXT NOT NULL,
+            metaheuristic TEXT NOT NULL,
+            limit_seconds REAL NOT NULL,
+            lns_operators TEXT NOT NULL,
+            lns_time_limit REAL,
+            distance_km REAL,
+            objective INTEGER,
+            vehicles INTEGER,
+            best_at REAL,
+            seconds REAL NOT NULL,
+            created TEXT NOT NULL,
+            PRIMARY KEY (cluster, config)
+        )"""
+    )
+    return conn
+
+
+def record(conn, row):
+    """結果の行を保存する (同じクラスタ・設定の行は置き換える)"""
+    row = dict(
+        row,
+        lns_operators=",".join(row["lns_operators"]),
+        created=datetime.datetime.now().isoformat(timespec="seconds"),
+    )
+    conn.execute(
+        f"INSERT OR REPLACE INTO runs ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+        [row[c] for c in COLUMNS],
+    )
+    conn.commit()
+
+
+def load_runs(conn):
+    """保存済みの結果を dict のリストで返す"""
+    cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM runs ORDER BY cluster, config")
+    return [dict(zip(COLUMNS, values)) for values in cursor]
+
+
+def sweep(cluster_ids, configs, workers=1, db_path=DB_PATH, force=False):
+    """まだ結果のないクラスタ × 設定の組を解いて保存し、解いた行のリストを返す"""
+    conn = connect(db_path)
+    done = {(row["cluster"], row["config"]) for row in load_runs(conn)}
+    tasks = [
+        (cluster_id, config)
+        for cluster_id in cluster_ids
+        for config in configs
+        if force or (cluster_id, config_key(config)) not in done
+    ]
+    print(f"{len(tasks)} runs to solve ({len(cluster_ids) * len(configs) - len(tasks)} cached)")
+
+    rows = [None] * len(tasks)
+    # 終わった組から保存して、途中で止めてもそこまでの結果を残す
+    for i, row, _ in iter_pool(run_task, tasks, workers):
+        record(conn, row)
+        rows[i] = row
+    conn.close()
+    return rows
+
+
+def size_class(nodes, bins=SIZE_BINS):
+    """世帯数 nodes を "300-500" のような大きさの区分にする"""
+    i = int(np.searchsorted(bins, nodes, side="right"))
+    lower = bins[i - 1] if i > 0 else 0
+    return f"{lower}-{bins[i]}" if i < len(bins) else f"{lower}-"
+
+
+def best_by_size(runs, bins=SIZE_BINS):
+    """大きさの区分・秒数ごとに、gap の平均が最小の設定の行を返す
+
+    gap はクラスタごとの最短距離に対する差の割合で、区分内のすべての
+    クラスタで解けた設定だけを比べる。
+    """
+    best_km = {}
+    for row in runs:
+        if row["distance_km"] is not None:
+            best_km[row["cluster"]] = min(
+                best_km.get(row["cluster"], np.inf), row["distance_km"]
+            )
+
+    groups = {}
+    for row in runs:
+        key = (size_class(row["nodes"] - 1, bins), row["limit_seconds"])
+        groups.setdefault(key, {}).setdefault(row["config"], []).append(row)
+
+    rows = []
+    for (size, limit), by_config in sorted(
+        groups.items(), key=lambda item: (int(item[0][0].split("-")[0]), item[0][1])
+    ):
+        clusters = {row["cluster"] for rs in by_config.values() for row in rs}
+        candidates = []
+        for config_rows in by_config.values():
+            solved = [row for row in config_rows if row["distance_km"] is not None]
+            if {row["cluster"] for row in solved} != clusters:
+                continue
+            gaps = [row["distance_km"] / best_km[row["cluster"]] - 1 for row in solved]
+            candidates.append((float(np.mean(gaps)), config_rows[0]))
+        if not candidates:
+            continue
+        gap, row = min(candidates, key=lambda c: c[0])
+        rows.append(
+            {
+                "size": size,
+                "clusters": len(clusters),
+                "configs": len(by_config),
+                "limit_seconds": limit,
+                "first_solution_strategy": row["first_solution_strategy"],
+                "metaheuristic": row["metaheuristic"],
+                "lns_operators": row["lns_operators"] or "-",
+                "gap_percent": gap * 100,
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=["run", "report"])
+    parser.add_argument(
+        "--clusters", type=int, nargs="+", default=list(range(1, 11)), help="解くクラスタ"
+    )
+    search = parser.add_mutually_exclusive_group()
+    search.add_argument("--grid", action="store_true", help="すべての組み合わせを解く (既定)")
+    search.add_argument(
+        "--random", type=int, default=None, metavar="N", help="組み合わせから N 個を無作為に選んで解く"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="--random の乱数の種")
+    parser.add_argument("--strategies", nargs="+", default=STRATEGIES)
+    parser.add_argument("--metaheuristics", nargs="+", default=METAHEURISTICS)
+    parser.add_argument("--limit-seconds", type=float, nargs="+", default=LIMIT_SECONDS)
+    parser.add_argument(
+        "--lns",
+        nargs="+",
+        default=None,
+        metavar="OPS",
+        help="LNS 近傍の組をカンマ区切りで並べる (例: none path_lns path_lns,tsp_lns)",
+    )
+    parser.add_argument(
+        "--lns-time-limit", type=float, default=None, help="LNS 1回あたりの秒数"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="並列に解くプロセス数")
+    parser.add_argument("--db", default=DB_PATH, help="結果のデータベース")
+    parser.add_argument("--force", action="store_true", help="保存済みの組も解き直す")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        lns_choices = LNS_CHOICES
+        if args.lns is not None:
+            lns_choices = [
+                () if ops == "none" else tuple(ops.split(",")) for ops in args.lns
+            ]
+        choices = {
+            "strategies": args.strategies,
+            "metaheuristics": args.metaheuristics,
+            "limits": args.limit_seconds,
+            "lns_choices": lns_choices,
+            "lns_time_limit": args.lns_time_limit,
+        }
+        if args.random:
+            configs = random_configs(args.random, args.seed, **choices)
+        else:
+            configs = grid(**choices)
+        start = time.perf_counter()
+        rows = [
+            dict(row, lns_operators=",".join(row["lns_operators"]) or "-")
+            for row in sweep(args.clusters, configs, args.workers, args.db, args.force)
+        ]
+        print("=== Runs ===")
+        print_summary(
+            rows,
+            [
+                "cluster",
+                "first_solution_strategy",
+                "metaheuristic",
+                "limit_seconds",
+                "lns_operators",
+                "distance_km",
+                "seconds",
+            ],
+        )
+        print(f"Total: {time.perf_counter() - start:.1f}s")
+
+    conn = connect(args.db)
+    runs = [row for row in load_runs(conn) if row["cluster"] in args.clusters]
+    conn.close()
+    print("=== Best configuration by cluster size ===")
+    print_summary(
+        best_by_size(runs),
+        [
+            "size",
+            "clusters",
+            "configs",
+            "limit_seconds",
+            "first_solution_strategy",
+            "metaheuristic",
+            "lns_operators",
+            "gap_percent",
+        ],
+    )
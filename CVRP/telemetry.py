@@ -0,0 +1,53 @@
+"""1回の求解の中で解の改善を記録する (AddAtSolutionCallback)
+
+探索中に解が見つかるたびに呼ばれ、目的関数値が改善したときだけ
+(経過秒, 目的関数値) を記録する。compact() で間引いた記録が
+Solution.curve になるので、1回解くだけで改善曲線が得られる。
+
+早期打ち切り: stall_seconds 秒のあいだ、最良値が stall_ratio 以上
+(相対) 改善しなければ探索を終える。判定は解が見つかったときに行う。
+"""
+
+import time
+
+
+class SolutionTrace:
+    """RoutingModel に付けて、改善した解の時刻と目的関数値を記録する"""
+
+    def __init__(self, routing, stall_seconds=None, stall_ratio=0.0):
+        self.routing = routing
+        self.stall_seconds = stall_seconds
+        self.stall_ratio = stall_ratio
+        self.seconds = []
+        self.objectives = []
+        self.stopped_early = False
+        self._start = time.perf_counter()
+        # 打ち切り判定の基準 (この値から stall_ratio 以上よくなったら改善とみなす)
+        self._mark = None
+        self._mark_time = 0.0
+        routing.AddAtSolutionCallback(self._on_solution)
+
+    def _on_solution(self):
+        now = time.perf_counter() - self._start
+        objective = self.routing.CostVar().Value()
+        if not self.objectives or objective < self.objectives[-1]:
+            self.seconds.append(now)
+            self.objectives.append(objective)
+
+        if self._mark is None or objective < self._mark * (1 - self.stall_ratio):
+            self._mark = objective
+            self._mark_time = now
+        elif self.stall_seconds is not None and now - self._mark_time >= self.stall_seconds:
+            self.stopped_early = True
+            self.routing.solver().FinishCurrentSearch()
+
+    def compact(self, ratio=1e-3):
+        """直前に残した点から ratio 以上改善した点 (と最後の点) だけを返す"""
+        seconds, objectives = [], []
+        for i, (t, objective) in enumerate(zip(self.seconds, self.objectives)):
+            last = i == len(self.objectives) - 1
+            if not objectives or objective <= objectives[-1] * (1 - ratio) or last:
+                seconds.append(t)
+                objectives.append(objective)
+        return seconds, objectives
+
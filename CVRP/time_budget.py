@@ -0,0 +1,128 @@
+"""クラスタ間でソルバーの持ち時間を配分する
+
+全体の持ち時間 (壁時計の秒数) を、クラスタの大きさ、または
+cvrp_limit_seconds.py が記録した改善曲線に応じて配分する。
+早く収束したクラスタの余り時間は、まだ解いていないクラスタに回す。
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from parallel import run_isolated
+
+CURVE_DIR = "output/curves"
+
+
+def save_curve(cluster_id, limit_seconds, total_distance_km, curve_dir=CURVE_DIR):
+    """改善曲線 (秒 → 総距離[km]) を CSV に保存する"""
+    os.makedirs(curve_dir, exist_ok=True)
+    pd.DataFrame(
+        {"limit_seconds": limit_seconds, "total_distance_km": total_distance_km}
+    ).to_csv(os.path.join(curve_dir, f"cluster{cluster_id:02d}.csv"), index=False)
+
+
+def load_curves(cluster_ids, curve_dir=CURVE_DIR):
+    """保存済みの改善曲線を {cluster_id: (秒の配列, 距離の配列)} で返す"""
+    curves = {}
+    for cluster_id in cluster_ids:
+        path = os.path.join(curve_dir, f"cluster{cluster_id:02d}.csv")
+        if os.path.exists(path):
+            df = pd.read_csv(path).sort_values("limit_seconds")
+            curves[cluster_id] = (
+                df["limit_seconds"].to_numpy(dtype=np.float64),
+                df["total_distance_km"].to_numpy(dtype=np.float64),
+            )
+    return curves
+
+
+def allocate_by_curves(
+    cluster_ids, sizes, curves, total_seconds, min_seconds=1.0, step=0.5
+):
+    """改善曲線から、次の step 秒で最も距離が縮むクラスタに順に時間を配る
+
+    曲線は単調減少になるよう補正し、測った範囲より先の改善は0とみなす。
+    曲線のないクラスタや、改善が見込めなくなった後の余りはノード数に比例して配る。
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    alloc = np.full(len(cluster_ids), float(min_seconds))
+    remaining = total_seconds - alloc.sum()
+
+    def predicted(i, t):
+        cluster_id = cluster_ids[i]
+        if cluster_id not in curves:
+            return 0.0
+        ts, ds = curves[cluster_id]
+        return np.interp(t, ts, np.minimum.accumulate(ds))
+
+    has_curve = [cluster_id in curves for cluster_id in cluster_ids]
+    while remaining >= step and any(has_curve):
+        gains = [
+            predicted(i, alloc[i]) - predicted(i, alloc[i] + step) if has_curve[i] else 0
+            for i in range(len(alloc))
+        ]
+        best = int(np.argmax(gains))
+        if gains[best] <= 0:
+            break
+        alloc[best] += step
+        remaining -= step
+
+    if remaining > 0:
+        alloc += remaining * sizes / sizes.sum()
+    return alloc
+
+
+def run_with_budget(func, tasks, weights, total_seconds, workers=1, min_seconds=1.0):
+    """持ち時間を配分しながら func(*args, limit_seconds=...) を実行する
+
+    各タスクには開始時点で「残り時間 × 自分の重み / 未開始タスクの重みの合計」
+    を割り当てる。早く終わったタスクの余りは自動的に後のタスクに回る。
+    workers > 1 のときは total_seconds × workers をプロセスで分け合う。
+    戻り値は入力順の (戻り値, 実時間[秒], 割当時間[秒]) のリスト。
+    """
+    budget = total_seconds * max(workers, 1)
+    weights = np.asarray(weights, dtype=np.float64)
+    # 大きいタスクから始めると並列時の待ちが少ない
+    pending = sorted(range(len(tasks)), key=lambda i: -weights[i])
+    results = [None] * len(tasks)
+    state = {"spent": 0.0, "committed": 0.0}
+
+    def next_share(i):
+        remaining = budget - state["spent"] - state["committed"]
+        share = remaining * weights[i] / weights[pending].sum()
+        return max(min_seconds, share)
+
+    if workers <= 1:
+        while pending:
+            i = pending[0]
+            limit = next_share(i)
+            pending.pop(0)
+            result, log, elapsed = run_isolated(func, *tasks[i], limit_seconds=limit)
+            print(log, end="", flush=True)
+            state["spent"] += elapsed
+            results[i] = (result, elapsed, limit)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while pending or running:
+            while pending and len(running) < workers:
+                i = pending[0]
+                limit = next_share(i)
+                pending.pop(0)
+                state["committed"] += limit
+                future = executor.submit(
+                    run_isolated, func, *tasks[i], limit_seconds=limit
+                )
+                running[future] = (i, limit)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, limit = running.pop(future)
+                result, log, elapsed = future.result()
+                print(log, end="", flush=True)
+                state["committed"] -= limit
+                state["spent"] += elapsed
+                results[i] = (result, elapsed, limit)
+    return results
@@ -0,0 +1,186 @@
+"""時間枠 (VRPTW) と作業時間
+
+- 移動時間[秒] は距離行列[m] を地域ごとの速度で割って作る。区間の速度は
+  両端の世帯の地域の速度の平均 (ペースの平均) とする
+- 地域は世帯の用途地域の列 (enrich_households で加わる zoning_*) から
+  ZONE_SPEEDS_KMH の部分一致で決め、列がなければすべて DEFAULT_SPEED_KMH
+- 移動時間の行列は距離行列と同じく matrix_cache に保存する
+- 世帯の列 tw_start / tw_end (出発からの分) があれば時間枠にし、なければ
+  HORIZON_SECONDS の中ならいつでもよい
+- 各世帯で SERVICE_SECONDS の作業時間 (荷下ろし) がかかる
+"""
+
+import functools
+import hashlib
+
+import numpy as np
+
+import store
+from callbacks import index_to_node_array
+from matrix_cache import cached_distance_matrix
+
+DEFAULT_SPEED_KMH = 20
+# 用途地域名に含まれる語 → 走行速度[km/h] (上から順に最初に一致したもの)
+ZONE_SPEEDS_KMH = {
+    "商業": 12,
+    "住居": 18,
+    "工業": 25,
+}
+SERVICE_SECONDS = 60
+HORIZON_SECONDS = 8 * 3600
+WINDOW_COLUMNS = ("tw_start", "tw_end")
+
+
+def zone_speeds(zones, default=DEFAULT_SPEED_KMH, speeds=ZONE_SPEEDS_KMH):
+    """用途地域名の配列から速度[km/h] の配列を作る"""
+    result = np.full(len(zones), float(default))
+    assigned = np.zeros(len(zones), dtype=bool)
+    zones = np.asarray(zones, dtype=str)
+    for word, speed in speeds.items():
+        match = ~assigned & (np.char.find(zones, word) >= 0)
+        result[match] = speed
+        assigned |= match
+    return result
+
+
+def household_speeds(cluster_id, zone_column=None):
+    """デポと世帯の速度[km/h] (先頭がデポ) を返す"""
+    zones = None
+    if zone_column:
+        try:
+            zones = store.load_column(cluster_id, zone_column)
+        except KeyError:
+            print(f"⚠️ 世帯に {zone_column} 列がないため、速度を一律にします")
+    if zones is None:
+        return None
+    return np.concatenate([[DEFAULT_SPEED_KMH], zone_speeds(zones)])
+
+
+def household_windows(cluster_id, horizon=HORIZON_SECONDS, columns=WINDOW_COLUMNS):
+    """世帯の時間枠[秒] の (N, 2) 配列を返す (先頭がデポ。列がなければ全時間)"""
+    try:
+        start, end = (
+            np.asarray(store.load_column(cluster_id, column), dtype=np.float64) * 60
+            for column in columns
+        )
+    except KeyError:
+        return None
+    # 空欄は全時間
+    start = np.nan_to_num(start, nan=0)
+    end = np.nan_to_num(end, nan=horizon)
+    windows = np.column_stack([start, end]).round().astype(np.int64)
+    return np.vstack([[0, horizon], np.clip(windows, 0, horizon)])
+
+
+def _travel_seconds(points, distance, pace):
+    """距離[m] × 両端のペース[秒/m] の平均"""
+    distance = np.asarray(distance, dtype=np.float64)
+    return distance * ((pace[:, np.newaxis] + pace[np.newaxis, :]) / 2)
+
+
+class SparseTravelTime:
+    """疎な距離行列の get(i, j) から移動時間[秒] を返す"""
+
+    def __init__(self, distance_matrix, pace):
+        self.distance_matrix = distance_matrix
+        self.pace = pace.tolist()
+
+    def get(self, i, j):
+        return int(self.distance_matrix.get(i, j) * (self.pace[i] + self.pace[j]) / 2)
+
+
+def travel_time_matrix(points, distance_matrix, speeds_kmh, metric="euclidean"):
+    """移動時間[秒] の行列 (キャッシュした int32 行列、疎な距離行列なら get を持つもの)
+
+    キャッシュのキーは points と、距離行列のメトリック名 (matrix_cache と同じ
+    "euclidean" や road_metric(...)) と速度から作るので、距離行列そのものは
+    キャッシュにないときだけ読む。
+    """
+    pace = 3.6 / np.asarray(speeds_kmh, dtype=np.float64)
+    if not isinstance(distance_matrix, (list, np.ndarray)):
+        return SparseTravelTime(distance_matrix, pace)
+    h = hashlib.sha1(pace.tobytes())
+    return cached_distance_matrix(
+        points,
+        metric=f"time:{metric}:{h.hexdigest()}",
+        builder=functools.partial(_travel_seconds, distance=distance_matrix, pace=pace),
+    )
+
+
+def add_time_data(
+    data,
+    points,
+    service_seconds=SERVICE_SECONDS,
+    speeds=None,
+    windows=None,
+    horizon=HORIZON_SECONDS,
+    metric="euclidean",
+):
+    """data に time_matrix / service_times / time_windows / horizon を加える
+
+    speeds[km/h] と windows[秒] は先頭がデポの配列 (household_speeds /
+    household_windows)。None なら一律の速度・全時間とする。
+    metric は data["distance_matrix"] のメトリック名 (travel_time_matrix)。
+    """
+    if speeds is None:
+        speeds = np.full(len(points), float(DEFAULT_SPEED_KMH))
+    data["time_matrix"] = travel_time_matrix(
+        points, data["distance_matrix"], speeds, metric
+    )
+    data["service_times"] = [0] + [int(service_seconds)] * (len(points) - 1)
+    if windows is None:
+        windows = np.tile([0, horizon], (len(points), 1))
+    data["time_windows"] = np.asarray(windows).tolist()
+    data["horizon"] = horizon
+    return data
+
+
+def register_time_callback(routing, manager, data):
+    """(出発地の作業時間 + 移動時間) のコールバックを登録してインデックスを返す
+
+    密な行列は作業時間を足した行列を RegisterTransitMatrix で C++ 側に渡す。
+    """
+    service = np.asarray(data["service_times"])
+    time_matrix = data["time_matrix"]
+    if isinstance(time_matrix, np.ndarray):
+        transit = np.asarray(time_matrix, dtype=np.int64) + service[:, np.newaxis]
+        return routing.RegisterTransitMatrix(transit.tolist())
+
+    index_to_node = index_to_node_array(manager).tolist()
+    service = service.tolist()
+    get = time_matrix.get
+
+    def time_callback(from_index, to_index):
+        i, j = index_to_node[from_index], index_to_node[to_index]
+        return service[i] + get(i, j)
+
+    return routing.RegisterTransitCallback(time_callback)
+
+
+def add_time_dimension(routing, manager, data):
+    """時間の次元 "Time" を加え、各ノードの時間枠を設定して次元を返す
+
+    待ち時間は horizon まで認める。出発・帰着時刻はできるだけ詰める。
+    """
+    horizon = data["horizon"]
+    callback_index = register_time_callback(routing, manager, data)
+    routing.AddDimension(callback_index, horizon, horizon, False, "Time")
+    time_dimension = routing.GetDimensionOrDie("Time")
+    for node, (start, end) in enumerate(data["time_windows"]):
+        if node == data["depot"]:
+            continue
+        time_dimension.CumulVar(manager.NodeToIndex(node)).SetRange(start, end)
+    depot_start, depot_end = data["time_windows"][data["depot"]]
+    for vehicle_id in range(data["num_vehicles"]):
+        for index in (routing.Start(vehicle_id), routing.End(vehicle_id)):
+            time_dimension.CumulVar(index).SetRange(depot_start, depot_end)
+            routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(index))
+    return time_dimension
+
+
+def latest_return(routing, solution, time_dimension, num_vehicles):
+    """いちばん遅く帰着した車両の時刻[秒]"""
+    return max(
+        solution.Min(time_dimension.CumulVar(routing.End(vehicle_id)))
+        for vehicle_id in range(num_vehicles)
+    )
@@ -1,19 +1,20 @@
 # === 新しいmain関数を以下のように変更 ===
 """Capacited Vehicles Routing Problem (CVRP)."""
 
-import math
-import random
+import argparse
+import time
 from matplotlib import pyplot as plt
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
-import json
-import pandas as pd
 import numpy as np
-from scipy.spatial import distance_matrix
 from calc_lat_lon import calc_lat_lon
+from core import Solution, print_solution, solve_cluster
+from depot_siting import candidate_grid, score_sites
+from depot_sweep import DepotSweep
+from store import load_centers, load_cluster
+from geojson_writer import write_features
+from parallel import print_summary, run_pool
 
 
-def print_graph(x, y):
+def print_graph(cluster_id, x, y):
     plt.figure(figsize=(8, 5))
 
     # 最初の1点（赤・大きめ）
@@ -40,245 +41,168 @@ def print_graph(x, y):
     plt.close()
 
 
-# クラスターidと何秒で解くか決める
-cluster_id = 3
-limit_seconds = 1
-
-cluster_radius = 10  # km
-
-# 結果を格納する変数
-centers = []
-results_total_distance = []
-
-df_center = pd.read_csv("output/centers.csv")
-original_center = df_center[["x", "y"]].iloc[cluster_id - 1].values
-print("original_center", original_center)
-
-centers.append(original_center)
-for i in range(1, cluster_radius + 1):
-    x = random.randint(0, int((1000 * i) / math.sqrt(2)))
-    y = math.sqrt((1000 * i) ** 2 - x**2)
-
-    sign_x = random.choice([-1, 1])
-    sign_y = random.choice([-1, 1])
-
-    offset = np.array([sign_x * x, sign_y * y])
-    centers.append(original_center + offset)
-
-results_x = [float(c[0]) for c in centers]
-results_y = [float(c[1]) for c in centers]
-print_graph(results_x, results_y)
-
-
-def print_solution(data, manager, routing, solution):
-    print(f"Objective: {solution.ObjectiveValue()}")
-    total_distance = 0
-    total_load = 0
-    for vehicle_id in range(data["num_vehicles"]):
-        index = routing.Start(vehicle_id)
-        plan_output = f"Route for vehicle {vehicle_id}:\n"
-        route_distance = 0
-        route_load = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_load += data["demands"][node_index]
-            plan_output += f" {node_index} Load({route_load}) -> "
-            previous_index = index
-            index = solution.Value(routing.NextVar(index))
-            route_distance += routing.GetArcCostForVehicle(
-                previous_index, index, vehicle_id
-            )
-        plan_output += f" {manager.IndexToNode(index)} Load({route_load})\n"
-        plan_output += f"Distance of the route: {route_distance}m\n"
-        plan_output += f"Load of the route: {route_load}\n"
-        # print(plan_output)
-        total_distance += route_distance
-        total_load += route_load
-    print(f"Total distance of all routes: {total_distance /1000}km")
-    print(f"Total load of all routes: {total_load}")
-
-
-def create_geojson(data, manager, routing, solution):
-    features = []
-    features.append(
-        {
-            "type": "Feature",
-            "properties": {
-                "marker-color": "#FF0000",
-                "marker-size": "large",
-                "marker-symbol": "warehouse",
-                "name": f"Depot {cluster_id}",
-            },
-            "geometry": {"type": "Point", "coordinates": locations_lon_lat[0].tolist()},
-        }
-    )
+# 既定のクラスターidと何秒で解くか
+CLUSTER_ID = 3
+LIMIT_SECONDS = 1
 
-    for i in range(1, len(data["distance_matrix"])):
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "marker-color": "#00FF00",
-                    "marker-size": "small",
-                    "marker-symbol": "circle",
-                    "name": f"Customer {i}",
-                },
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": locations_lon_lat[i].tolist(),
-                },
-            }
-        )
+CLUSTER_RADIUS = 10  # km
+NUM_CANDIDATES = 10  # 重心のほかに解く候補地の数
 
-    colors = [
-        "#1f77b4",
-        "#ff7f0e",
-        "#2ca02c",
-        "#d62728",
-        "#9467bd",
-        "#8c564b",
-        "#e377c2",
-        "#7f7f7f",
-        "#bcbd22",
-        "#17becf",
-    ]
 
-    for vehicle_id in range(data["num_vehicles"]):
-        index = routing.Start(vehicle_id)
-        route = []
+def make_centers(
+    cluster_id=CLUSTER_ID, cluster_radius=CLUSTER_RADIUS, num_candidates=NUM_CANDIDATES
+):
+    """k-meansの重心と、半径 cluster_radius km 内で見積もり費用の安い候補地を作る
 
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            if node_index < len(locations):
-                route.append(locations_lon_lat[node_index].tolist())
-            index = solution.Value(routing.NextVar(index))
+    プロセスプールの子プロセスで再実行されないよう、__main__ からだけ呼ぶ。
+    """
+    df_center = load_centers()
+    original_center = np.array(
+        [df_center["x"][cluster_id - 1], df_center["y"][cluster_id - 1]]
+    )
+    print("original_center", original_center)
 
-        node_index = manager.IndexToNode(index)
-        if node_index < len(locations):
-            route.append(locations_lon_lat[node_index].tolist())
+    # 半径 cluster_radius km 内の格子を代理モデルと地価で採点し、上位を解く
+    cluster_xy, _ = load_cluster(cluster_id)
+    table = score_sites(
+        candidate_grid(original_center, cluster_radius * 1000), cluster_xy[1:]
+    )
+    print(f"{len(table['x'])} candidates scored")
+    centers = [original_center] + [
+        np.array([x, y])
+        for x, y in zip(table["x"][:num_candidates], table["y"][:num_candidates])
+    ]
 
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "stroke": colors[cluster_id - 1],
-                    "stroke-width": 2,
-                    "stroke-opacity": 1,
-                    "vehicle": vehicle_id,
-                    "type": "route",
-                },
-                "geometry": {"type": "LineString", "coordinates": route},
-            }
-        )
+    results_x = [float(c[0]) for c in centers]
+    results_y = [float(c[1]) for c in centers]
+    print_graph(cluster_id, results_x, results_y)
+    return centers
 
-    geojson = {"type": "FeatureCollection", "features": features}
 
-    return geojson
+def center_lon_lat(center):
+    """候補地の平面直角座標を [経度, 緯度] にする"""
+    center_lat, center_lon = calc_lat_lon(center[0], center[1], 36.0, 139 + 50.0 / 60)
+    return [center_lon, center_lat]
 
 
-def save_geojson(geojson, filename):
-    with open(filename, "w") as f:
-        json.dump(geojson, f, indent=2)
+def save_center_geojson(solution, locations_lon_lat, cluster_id, center_index):
+    filename = f"geojson/move_center/cluster{cluster_id:02d}/center{center_index:02d}.geojson"
+    write_features(
+        solution.iter_geojson_features(locations_lon_lat, cluster_id), filename
+    )
     print(f"✅GeoJSON saved to {filename}")
 
 
-def main(center_index):
-    global distance_matrix, locations, locations_lon_lat
-
-    center = centers[center_index]
+def main(center_index, center, cluster_id=CLUSTER_ID, limit_seconds=LIMIT_SECONDS):
+    """center をデポにしてクラスタを解き、総距離[km] を返す (解がなければ None)"""
     print(f"Running CVRP for center {center_index}, center: {center}")
 
-    df = pd.read_csv(f"output/cluster{cluster_id:02d}.csv")
-    cluster_points = df[["x", "y"]].values
-    locations = np.vstack([center.reshape(1, 2), cluster_points])
-    points = np.array(locations)
-
-    cluster_points = df[["longitude", "latitude"]].values
-    locations_lon_lat = np.vstack([center.reshape(1, 2), cluster_points])
+    cluster_xy, cluster_lon_lat = load_cluster(cluster_id)
+    locations_lon_lat = np.vstack([center_lon_lat(center), cluster_lon_lat[1:]])
 
-    center_lat, center_lon = calc_lat_lon(
-        center.reshape(1, 2)[0][0], center.reshape(1, 2)[0][1], 36.0, 139 + 50.0 / 60
+    solution = solve_cluster(
+        cluster_xy[1:], center, {"limit_seconds": limit_seconds}
     )
 
-    locations_lon_lat[0] = [center_lon, center_lat]
+    if solution:
+        print(f"Objective: {solution.objective}")
+        print_solution(solution)
+        save_center_geojson(solution, locations_lon_lat, cluster_id, center_index)
+        return solution.distance_km
+    else:
+        print(f"❌No solution found for center {center_index}.")
+        return None
 
-    # print("aaaaaaa", locations_lon_lat[0], locations_lon_lat[1])
 
-    distance_mat = distance_matrix(points, points).astype(int)
-    num_vehicles = math.ceil((len(locations) - 1) / 50)
+def sweep(centers, cluster_id=CLUSTER_ID, limit_seconds=LIMIT_SECONDS):
+    """候補地を順番に解く (main を候補地ごとに呼ぶ代わり)
 
-    def create_data_model():
-        data = {}
-        data["distance_matrix"] = distance_mat.tolist()
-        data["demands"] = [0] + [1] * (len(distance_mat) - 1)
-        data["vehicle_capacities"] = [50] * num_vehicles
-        data["num_vehicles"] = num_vehicles
-        data["depot"] = 0
-        return data
+    顧客どうしの距離は一度だけ計算してデポの行・列だけを差し替え、
+    各候補地は一つ前の候補地のルートを初期解にして探索する。
+    main と同じく候補地ごとの (総距離[km], 秒) のリストを返す。
+    """
+    cluster_xy, cluster_lon_lat = load_cluster(cluster_id)
+    depot_sweep = DepotSweep(cluster_xy[1:])
+    customers_lon_lat = cluster_lon_lat[1:]
 
-    data = create_data_model()
-    manager = pywrapcp.RoutingIndexManager(
-        len(data["distance_matrix"]), data["num_vehicles"], data["depot"]
-    )
-    routing = pywrapcp.RoutingModel(manager)
+    results = []
+    routes = None
+    for center_index, center in enumerate(centers):
+        start = time.perf_counter()
+        print(f"Running CVRP for center {center_index}, center: {center}")
 
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data["distance_matrix"][from_node][to_node]
+        locations_lon_lat = np.vstack([center_lon_lat(center), customers_lon_lat])
 
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+        manager, routing, assignment = depot_sweep.solve(
+            center, limit_seconds, initial_routes=routes
+        )
 
-    def demand_callback(from_index):
-        from_node = manager.IndexToNode(from_index)
-        return data["demands"][from_node]
+        total_distance = None
+        if assignment:
+            solution = Solution.from_assignment(
+                depot_sweep.data, manager, routing, assignment
+            )
+            print(f"Objective: {solution.objective}")
+            print_solution(solution)
+            save_center_geojson(solution, locations_lon_lat, cluster_id, center_index)
+            total_distance = solution.distance_km
+            routes = solution.routes
+        else:
+            print(f"❌No solution found for center {center_index}.")
+        results.append((total_distance, time.perf_counter() - start))
+    return results
 
-    demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
-    routing.AddDimensionWithVehicleCapacity(
-        demand_callback_index, 0, data["vehicle_capacities"], True, "Capacity"
-    )
 
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+# === 実行部分 ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="並列に解くプロセス数"
     )
-    search_parameters.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    parser.add_argument("--cluster", type=int, default=CLUSTER_ID, help="クラスターid")
+    parser.add_argument("--limit-seconds", type=float, default=LIMIT_SECONDS)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="顧客間の距離を使い回し、前の候補地の解から順番に解く (--workers は無視)",
     )
-    search_parameters.time_limit.FromSeconds(limit_seconds)
+    args = parser.parse_args()
 
-    solution = routing.SolveWithParameters(search_parameters)
-
-    if solution:
-        print_solution(data, manager, routing, solution)
-        geojson = create_geojson(data, manager, routing, solution)
-        save_geojson(
-            geojson,
-            filename=f"geojson/move_center/cluster{cluster_id:02d}/center{center_index:02d}.geojson",
-        )
-        total_distance = solution.ObjectiveValue() / 1000  # km
-        return total_distance
+    cluster_id = args.cluster
+    centers = make_centers(cluster_id)
+    if args.incremental:
+        results = sweep(centers, cluster_id, args.limit_seconds)
     else:
-        print(f"❌No solution found for center {center_index}.")
-        return None
-
-
-# 距離行列の上書き用関数名変更
-def distance_matrix_func(points1, points2):
-    return distance_matrix(points1, points2)
-
+        results = run_pool(
+            main,
+            [(i, c, cluster_id, args.limit_seconds) for i, c in enumerate(centers)],
+            args.workers,
+        )
 
-# === 実行部分 ===
-if __name__ == "__main__":
-    for i in range(0, cluster_radius + 1):
-        total_distance = main(i)
+    results_total_distance = []
+    rows = []
+    for (center_index, center), (total_distance, elapsed) in zip(
+        enumerate(centers), results
+    ):
+        rows.append(
+            {
+                "center": center_index,
+                "x": float(center[0]),
+                "y": float(center[1]),
+                "distance_km": total_distance,
+                "seconds": elapsed,
+            }
+        )
         if total_distance is not None:
             results_total_distance.append(total_distance)
 
+    print("=== Summary ===")
+    print_summary(rows, ["center", "x", "y", "distance_km", "seconds"])
+
     print(f"\n📊 All total distances for cluster {cluster_id}:")
     print(results_total_distance)
     print_graph(
+        cluster_id,
         [distance_km for distance_km in range(0, len(results_total_distance))],
         results_total_distance,
     )
@@ -0,0 +1,150 @@
+"""解 (ルート) の保存と、保存した解からの再開
+
+ルートは顧客の経度・緯度の列として output/routes/ に JSON で保存する。
+ノード番号ではなく座標で持つので、世帯が少し増減した翌日の計画でも
+前日のルートを初期解に使える。
+
+- いなくなった世帯はルートから外す
+- 新しい世帯は、積載 (需要の合計) に余裕のあるルートの最も安い位置に挿入する
+"""
+
+import json
+import os
+
+ROUTES_DIR = "output/routes"
+
+
+def routes_path(cluster_id, routes_dir=ROUTES_DIR):
+    return os.path.join(routes_dir, f"cluster{cluster_id:02d}.json")
+
+
+def save_routes(path, routes, locations_lonlat):
+    """車両ごとの顧客ノード列 (デポを除く) を座標の列にして保存する"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {
+        "depot": locations_lonlat[0].tolist(),
+        "routes": [[locations_lonlat[node].tolist() for node in route] for route in routes],
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def load_routes(
+    path, locations_lonlat, distance_matrix, num_vehicles, capacity=50, demands=None
+):
+    """保存した解を今のノード番号のルートに直して返す (ファイルがなければ None)
+
+    capacity は1台の容量か車両ごとの容量のリスト、demands はノードごとの需要
+    (先頭がデポ。None ならすべて1)。積載が容量を超えたルートの残りの顧客と、
+    num_vehicles よりあふれたルートの顧客は、新しい世帯と同じく挿入し直す。
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        saved = json.load(f)
+    capacities = _capacities(capacity, num_vehicles)
+    demands = _demands(demands, len(locations_lonlat))
+
+    # 同じ座標の世帯が複数あっても1回ずつ割り当てる
+    nodes_at = {}
+    for node, lonlat in enumerate(locations_lonlat[1:].tolist(), start=1):
+        nodes_at.setdefault(tuple(lonlat), []).append(node)
+    routes = [
+        [nodes_at[key].pop() for key in map(tuple, route) if nodes_at.get(key)]
+        for route in saved["routes"]
+    ]
+    routes += [[] for _ in range(num_vehicles - len(routes))]
+    routes = [
+        _within_capacity(route, cap, demands)
+        for route, cap in zip(routes[:num_vehicles], capacities)
+    ]
+
+    routed = {node for route in routes for node in route}
+    missing = [node for node in range(1, len(locations_lonlat)) if node not in routed]
+    if missing:
+        insert_nodes(routes, missing, distance_matrix, capacities, demands=demands)
+    return routes
+
+
+def load_routes_for(path, locations_lonlat, data):
+    """core.solve_cluster の initial_routes 用: data の距離行列・車両・需要で load_routes する"""
+    return load_routes(
+        path,
+        locations_lonlat,
+        data["distance_matrix"],
+        data["num_vehicles"],
+        data["vehicle_capacities"],
+        data["demands"],
+    )
+
+
+def _capacities(capacity, num_vehicles):
+    if isinstance(capacity, (int, float)):
+        return [capacity] * num_vehicles
+    return list(capacity)
+
+
+def _demands(demands, num_nodes):
+    if demands is None:
+        return [0] + [1] * (num_nodes - 1)
+    return list(demands)
+
+
+def _within_capacity(route, capacity, demands):
+    """route の先頭から、積載が capacity を超えない所までを返す"""
+    load = 0
+    for i, node in enumerate(route):
+        load += demands[node]
+        if load > capacity:
+            return route[:i]
+    return route
+
+
+def insert_nodes(routes, nodes, distance_matrix, capacity=50, depot=0, demands=None):
+    """nodes を1つずつ、積載に余裕のあるルートの最も安い位置に挿入する (routes を書き換える)
+
+    capacity は1台の容量か車両ごとの容量のリスト、demands はノードごとの需要
+    (None ならすべて1)。
+    """
+    capacities = _capacities(capacity, len(routes))
+
+    def demand(node):
+        return 1 if demands is None else demands[node]
+
+    loads = [sum(demand(node) for node in route) for route in routes]
+    for node in nodes:
+        best = None
+        for vehicle_id, route in enumerate(routes):
+            if loads[vehicle_id] + demand(node) > capacities[vehicle_id]:
+                continue
+            path = [depot] + route + [depot]
+            for pos in range(len(path) - 1):
+                prev, nxt = path[pos], path[pos + 1]
+                cost = (
+                    distance_matrix[prev][node]
+                    + distance_matrix[node][nxt]
+                    - distance_matrix[prev][nxt]
+                )
+                if best is None or cost < best[0]:
+                    best = (cost, vehicle_id, pos)
+        if best is None:
+            raise ValueError(f"no vehicle has room for node {node}")
+        _, vehicle_id, pos = best
+        routes[vehicle_id].insert(pos, node)
+        loads[vehicle_id] += demand(node)
+    return routes
+
+
+def solve_from_routes(routing, search_parameters, initial_routes):
+    """initial_routes を初期解にして解く (読み込めなければ通常どおり解く)"""
+    if initial_routes is not None:
+        routing.CloseModelWithParameters(search_parameters)
+        initial_assignment = routing.ReadAssignmentFromRoutes(initial_routes, True)
+        if initial_assignment is not None:
+            return routing.SolveFromAssignmentWithParameters(
+                initial_assignment, search_parameters
+            )
+        print("⚠️ 保存したルートを初期解にできないため、最初から解きます")
+    return routing.SolveWithParameters(search_parameters)